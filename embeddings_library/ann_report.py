@@ -0,0 +1,141 @@
+import argparse
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+
+from faiss_storage import exact_rerank, existing_shards, open_storage
+
+
+def parse_param_grid(specs: List[str]) -> List[Dict[str, Any]]:
+    # "nprobe=1,8,32" -> [{"nprobe": 1}, {"nprobe": 8}, {"nprobe": 32}]
+    grid = []
+    for spec in specs:
+        name, values = spec.split('=', 1)
+        grid.extend({name: int(value)} for value in values.split(','))
+    return grid or [{}]
+
+
+def timed_search(index, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    distances, ids = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+    return distances, ids, elapsed
+
+
+def recall_at_k(ids: np.ndarray, ground_truth: np.ndarray) -> float:
+    k = ground_truth.shape[1]
+    hits = sum(len(np.intersect1d(found, expected)) for found, expected in zip(ids, ground_truth))
+    return hits / (k * ground_truth.shape[0])
+
+
+def index_bytes(index) -> int:
+    # Serialized size, a close proxy for the index's resident memory.
+    return faiss.serialize_index(index).nbytes
+
+
+def recall_latency_report(vectors: np.ndarray, queries: np.ndarray, factory: str, k: int = 10,
+                          param_grid: Optional[List[Dict[str, Any]]] = None,
+                          train_size: Optional[int] = None,
+                          rerank_factors: Sequence[int] = ()) -> List[Dict[str, Any]]:
+    """Recall@k, latency and memory of `factory` against exact search.
+
+    Each rerank factor adds a row that searches k * factor candidates and re-ranks
+    them against the full-precision vectors, as FAISSStorage does with `rerank_factor`.
+    """
+    dimension = vectors.shape[1]
+
+    flat = faiss.IndexFlatL2(dimension)
+    flat.add(vectors)
+    _, ground_truth, flat_elapsed = timed_search(flat, queries, k)
+    flat_bytes = index_bytes(flat)
+    report = [{
+        "factory": "Flat",
+        "params": {},
+        "recall": 1.0,
+        "ms_per_query": 1000 * flat_elapsed / len(queries),
+        "bytes": flat_bytes,
+        "memory_saved": 0.0
+    }]
+
+    index = faiss.index_factory(dimension, factory)
+    if not index.is_trained:
+        sample = vectors
+        if train_size and train_size < len(vectors):
+            sample = vectors[np.random.choice(len(vectors), train_size, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    compressed_bytes = index_bytes(index)
+
+    parameter_space = faiss.ParameterSpace()
+    for params in param_grid or [{}]:
+        for name, value in params.items():
+            parameter_space.set_index_parameter(index, name, value)
+        _, ids, elapsed = timed_search(index, queries, k)
+        report.append({
+            "factory": factory,
+            "params": params,
+            "recall": recall_at_k(ids, ground_truth),
+            "ms_per_query": 1000 * elapsed / len(queries),
+            "bytes": compressed_bytes,
+            "memory_saved": 1 - compressed_bytes / flat_bytes
+        })
+        for rerank_factor in rerank_factors:
+            start = time.perf_counter()
+            distances, ids = index.search(queries, k * rerank_factor)
+            _, ids = exact_rerank(queries, distances, ids, vectors, k)
+            elapsed = time.perf_counter() - start
+            report.append({
+                "factory": factory,
+                "params": {**params, "rerank": rerank_factor},
+                "recall": recall_at_k(ids, ground_truth),
+                "ms_per_query": 1000 * elapsed / len(queries),
+                # The full-precision file is memory-mapped, so it costs disk rather than RAM.
+                "bytes": compressed_bytes,
+                "memory_saved": 1 - compressed_bytes / flat_bytes
+            })
+    return report
+
+
+def load_vectors(args) -> np.ndarray:
+    if args.vectors:
+        return np.ascontiguousarray(np.load(args.vectors, mmap_mode='r'), dtype=np.float32)
+    # Through the store rather than reconstruct_n, which treats positions as ids once an
+    # id map holds gaps left by removed vectors, and cannot read sharded stores.
+    shards = existing_shards(args.index)
+    stem, ext = os.path.splitext(args.index)
+    header_path = f"{stem}.shard0{ext}" if shards else args.index
+    dimension = faiss.read_index(header_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY).d
+    with open_storage(args.index, dimension, shards=max(shards, 1), read_only=True) as storage:
+        vectors, _ = storage.export_embeddings()
+        # A flat store's matrix is a view onto the index, which goes away with the store.
+        return np.array(vectors, dtype=np.float32)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare recall and latency of an ANN index against exact search.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--vectors", help="Path to an .npy matrix of float32 vectors")
+    source.add_argument("--index", help="Path to an existing store (index file) to read vectors from")
+    parser.add_argument("--factory", required=True, help="Index factory string, e.g. IVF1024,Flat or HNSW32")
+    parser.add_argument("--param", action="append", default=[], help="Search parameter sweep, e.g. nprobe=1,8,32")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of vectors to sample as queries")
+    parser.add_argument("--k", type=int, default=10, help="Number of neighbours to compare")
+    parser.add_argument("--train-size", type=int, help="Number of vectors to train on (default: all)")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[],
+                        help="Also report exact re-ranking of k * factor candidates, e.g. --rerank 2 4")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    query_ids = np.random.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = vectors[query_ids]
+
+    report = recall_latency_report(vectors, queries, args.factory, args.k,
+                                   parse_param_grid(args.param), args.train_size, args.rerank)
+    print(f"{'factory':<24}{'params':<24}{'recall@' + str(args.k):>10}{'ms/query':>12}{'MB':>10}{'saved':>8}")
+    for row in report:
+        params = ','.join(f"{name}={value}" for name, value in row['params'].items())
+        print(f"{row['factory']:<24}{params:<24}{row['recall']:>10.4f}{row['ms_per_query']:>12.4f}"
+              f"{row['bytes'] / 2**20:>10.2f}{row['memory_saved']:>8.1%}")
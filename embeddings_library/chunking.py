@@ -0,0 +1,93 @@
+import re
+import time
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from document_reader import file_digest, iter_pages, read_file
+
+CHUNK_STRATEGIES = ("file", "page", "tokens", "sentences")
+
+TOKEN_PATTERN = re.compile(r'\S+')
+SENTENCE_PATTERN = re.compile(r'[^\s.!?][^.!?]*(?:[.!?]+|$)')
+
+class Chunk(NamedTuple):
+    path: str
+    page: int
+    offset: int  # character offset of the chunk within its page
+    text: str
+
+def chunk_document(file_path: str, strategy: str = "file", size: int = 256, overlap: int = 32,
+                   start_page: int = 1) -> Iterator[Chunk]:
+    """Yield chunks of a document, reading PDFs one page at a time.
+
+    "file" keeps the old one-embedding-per-file behaviour, "page" yields each
+    page, and "tokens" / "sentences" slide a window of `size` units with
+    `overlap` units shared between neighbouring chunks within a page.
+    """
+    if strategy == "file":
+        if start_page == 1:
+            yield Chunk(file_path, 1, 0, read_file(file_path))
+        return
+    _check_strategy(strategy, size, overlap)
+    for page_number, text in iter_pages(file_path, start_page):
+        yield from chunk_page(file_path, page_number, text, strategy, size, overlap)
+
+def _check_strategy(strategy: str, size: int, overlap: int):
+    if strategy not in CHUNK_STRATEGIES:
+        raise ValueError(f"Unknown chunk strategy: {strategy}")
+    if strategy != "page" and not 0 <= overlap < size:
+        raise ValueError(f"Chunk overlap must be in [0, {size}), got {overlap}")
+
+def chunk_page(file_path: str, page_number: int, text: str, strategy: str, size: int,
+               overlap: int) -> Iterator[Chunk]:
+    if strategy == "page":
+        if text.strip():
+            yield Chunk(file_path, page_number, 0, text)
+        return
+    pattern = TOKEN_PATTERN if strategy == "tokens" else SENTENCE_PATTERN
+    spans = [match.span() for match in pattern.finditer(text)]
+    for start in range(0, len(spans), size - overlap):
+        window = spans[start:start + size]
+        yield Chunk(file_path, page_number, window[0][0], text[window[0][0]:window[-1][1]].strip())
+        if start + size >= len(spans):
+            break
+
+def chunk_block(file_path: str, strategy: str = "file", size: int = 256, overlap: int = 32, start_page: int = 1,
+                max_chunks: int = 256) -> Tuple[List[Chunk], Optional[int]]:
+    """Chunks of whole pages from `start_page` on, stopping once `max_chunks` is reached.
+
+    Returns (chunks, next_page); next_page is None when the document is exhausted. Lets
+    process-pool workers hand back large documents a bounded block at a time.
+    """
+    if strategy == "file":
+        return list(chunk_document(file_path, strategy, size, overlap, start_page)), None
+    _check_strategy(strategy, size, overlap)
+    chunks: List[Chunk] = []
+    for page_number, text in iter_pages(file_path, start_page):
+        chunks.extend(chunk_page(file_path, page_number, text, strategy, size, overlap))
+        if len(chunks) >= max_chunks:
+            # The next block may turn out to be empty if this was the last page.
+            return chunks, page_number + 1
+    return chunks, None
+
+def chunk_if_changed(file_path: str, known_hash: Optional[str], strategy: str = "file", size: int = 256,
+                     overlap: int = 32, max_chunks: int = 256) -> Tuple[str, Optional[List[Chunk]], Optional[int]]:
+    # Returns (content_hash, first block of chunks, next_page); the chunks are None when
+    # the hash matches `known_hash`.
+    content_hash = file_digest(file_path)
+    if content_hash == known_hash:
+        return content_hash, None, None
+    return (content_hash,) + chunk_block(file_path, strategy, size, overlap, 1, max_chunks)
+
+def timed_chunk_if_changed(file_path: str, known_hash: Optional[str], strategy: str = "file", size: int = 256,
+                           overlap: int = 32, max_chunks: int = 256
+                           ) -> Tuple[str, Optional[List[Chunk]], Optional[int], float]:
+    # Timed inside the worker process, so the seconds are extraction work rather than queueing.
+    start = time.perf_counter()
+    content_hash, chunks, next_page = chunk_if_changed(file_path, known_hash, strategy, size, overlap, max_chunks)
+    return content_hash, chunks, next_page, time.perf_counter() - start
+
+def timed_chunk_block(file_path: str, strategy: str, size: int, overlap: int, start_page: int,
+                      max_chunks: int) -> Tuple[List[Chunk], Optional[int], float]:
+    start = time.perf_counter()
+    chunks, next_page = chunk_block(file_path, strategy, size, overlap, start_page, max_chunks)
+    return chunks, next_page, time.perf_counter() - start
@@ -0,0 +1,31 @@
+# Kept free of heavy imports so process-pool workers start quickly.
+import hashlib
+from typing import Iterator, Tuple
+
+import PyPDF2
+
+
+def iter_pages(file_path: str, start_page: int = 1) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) one page at a time from `start_page` on; text files are a single page."""
+    if file_path.lower().endswith('.pdf'):
+        with open(file_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            for page_number in range(start_page, len(reader.pages) + 1):
+                yield page_number, reader.pages[page_number - 1].extract_text() or ''
+        return
+    if start_page > 1:
+        return
+    with open(file_path, 'r', encoding='utf-8') as file:
+        yield 1, file.read()
+
+
+def read_file(file_path: str) -> str:
+    return ' '.join(text for _, text in iter_pages(file_path))
+
+
+def file_digest(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def model_key(config: Dict[str, Any]) -> str:
+    """Identify an embedding model by module, function(s) and params.
+
+    Params that name existing files (e.g. a fitted model) also contribute their
+    mtime, so refitting a model invalidates its cached vectors.
+    """
+    params = config.get('params', {})
+    file_stamps = {
+        name: os.path.getmtime(value)
+        for name, value in params.items() if isinstance(value, str) and os.path.isfile(value)
+    }
+    return json.dumps({
+        "module": config['module'],
+        "function": config.get('function'),
+        "batch_function": config.get('batch_function'),
+        "params": params,
+        "files": file_stamps
+    }, sort_keys=True)
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk cache of embeddings, keyed by (model, sha256(text)).
+
+    Vectors are stored as float32 blobs in SQLite. Once the stored vectors exceed
+    `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, db_path: str, key: str, max_bytes: int = 1 << 30):
+        self.db_path = db_path
+        self.key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_key TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model_key, text_hash)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)')
+        self.conn.commit()
+        self._bytes = self.conn.execute('SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings').fetchone()[0]
+
+    @staticmethod
+    def text_hash(text: str) -> bytes:
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        hashes = [self.text_hash(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        unique = list(set(hashes))
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ', '.join('?' * len(batch))
+            rows = self.conn.execute(
+                f'SELECT text_hash, vector FROM embeddings WHERE model_key = ? AND text_hash IN ({placeholders})',
+                [self.key] + batch
+            )
+            found.update((text_hash, np.frombuffer(vector, dtype=np.float32)) for text_hash, vector in rows)
+
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                'UPDATE embeddings SET last_used = ? WHERE model_key = ? AND text_hash = ?',
+                ((now, self.key, text_hash) for text_hash in found)
+            )
+            self.conn.commit()
+
+        results = [found.get(text_hash) for text_hash in hashes]
+        hit_count = sum(result is not None for result in results)
+        self.hits += hit_count
+        self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        now = time.time()
+        rows = [
+            (self.key, self.text_hash(text), np.ascontiguousarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO embeddings (model_key, text_hash, vector, last_used) VALUES (?, ?, ?, ?)', rows
+        )
+        self._bytes += sum(len(row[2]) for row in rows)
+        if self._bytes > self.max_bytes:
+            self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        # Drop to 90% of the budget so eviction is not triggered on every insert.
+        count, total = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings').fetchone()
+        if not count:
+            return
+        excess = total - int(self.max_bytes * 0.9)
+        if excess > 0:
+            evict_count = math.ceil(excess / (total / count))
+            self.conn.execute(
+                'DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)',
+                (evict_count,)
+            )
+        self._bytes = self.conn.execute('SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings').fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self._bytes
+        }
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class CachingEmbeddingGenerator:
+    """Wraps an EmbeddingGenerator so only texts missing from the cache are embedded."""
+
+    def __init__(self, generator, cache: EmbeddingCache):
+        self.generator = generator
+        self.cache = cache
+
+    def generate_embedding(self, text: str) -> np.ndarray:
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        cached = self.cache.get_many(texts)
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        if missing:
+            # Embed each distinct missing text once, even if it repeats within the batch.
+            missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+            computed = self.generator.generate_embeddings(missing_texts)
+            self.cache.put_many(missing_texts, computed)
+            by_text = dict(zip(missing_texts, computed))
+            for i in missing:
+                cached[i] = by_text[texts[i]]
+        if not cached:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(cached).astype(np.float32, copy=False)
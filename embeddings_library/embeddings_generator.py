@@ -1,14 +1,25 @@
+import cProfile
+import itertools
 import os
-from typing import List, Dict, Any, Callable
+import queue
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator, NamedTuple, Optional, Sequence, Tuple
 import importlib
 import yaml
 import argparse
 import logging
+import numpy as np
 from logging.handlers import RotatingFileHandler
-import PyPDF2
 
 from jsonschema import validate
-from faiss_storage import FAISSStorage
+from chunking import CHUNK_STRATEGIES, Chunk, chunk_document, timed_chunk_block, timed_chunk_if_changed
+from embedding_cache import CachingEmbeddingGenerator, EmbeddingCache, model_key
+from faiss_storage import FAISSStorage, open_storage
+from ingest_metrics import IngestMetrics, JsonLinesSink, PrometheusTextFileSink
+from metadata_store import FileRecord
 
 
 # Update the logging setup
@@ -38,9 +49,62 @@ config_schema = {
             "properties": {
                 "module": {"type": "string"},
                 "function": {"type": "string"},
+                "batch_function": {"type": "string"},
+                "batch_size": {"type": "integer", "minimum": 1},
                 "params": {"type": "object"}
             },
-            "required": ["module", "function"]
+            "required": ["module"],
+            "anyOf": [{"required": ["function"]}, {"required": ["batch_function"]}]
+        },
+        "storage": {
+            "type": "object",
+            "properties": {
+                "flush_every": {"type": "integer", "minimum": 1},
+                "flush_interval": {"type": "number", "exclusiveMinimum": 0},
+                "shards": {"type": "integer", "minimum": 1}
+            }
+        },
+        "index": {
+            "type": "object",
+            "properties": {
+                "factory": {"type": "string"},
+                "train_size": {"type": "integer", "minimum": 1},
+                "search_params": {"type": "object"},
+                "rerank_factor": {"type": "integer", "minimum": 0}
+            }
+        },
+        "pipeline": {
+            "type": "object",
+            "properties": {
+                "workers": {"type": "integer", "minimum": 1},
+                "batch_size": {"type": "integer", "minimum": 1},
+                "queue_size": {"type": "integer", "minimum": 1}
+            }
+        },
+        "chunking": {
+            "type": "object",
+            "properties": {
+                "strategy": {"enum": list(CHUNK_STRATEGIES)},
+                "size": {"type": "integer", "minimum": 1},
+                "overlap": {"type": "integer", "minimum": 0}
+            }
+        },
+        "cache": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string"},
+                "max_bytes": {"type": "integer", "minimum": 1}
+            },
+            "required": ["path"]
+        },
+        "metrics": {
+            "type": "object",
+            "properties": {
+                "prometheus_path": {"type": "string"},
+                "jsonl_path": {"type": "string"},
+                "emit_interval": {"type": "number", "exclusiveMinimum": 0},
+                "profile_path": {"type": "string"}
+            }
         },
         "database_path": {"type": "string"},
         "input_paths": {
@@ -53,63 +117,355 @@ config_schema = {
 }
 
 class EmbeddingGenerator:
-    def __init__(self, generate_func: Callable[[str], List[float]]):
+    """Embeds text with a scalar (str -> vector) and/or batch (List[str] -> matrix) function.
+
+    Scalar-only functions are adapted to batches, so callers always get float32 arrays.
+    """
+
+    def __init__(self, generate_func: Optional[Callable[[str], Sequence[float]]] = None,
+                 batch_func: Optional[Callable[[List[str]], np.ndarray]] = None, batch_size: int = 32):
+        if generate_func is None and batch_func is None:
+            raise ValueError("EmbeddingGenerator needs a generate_func or a batch_func")
         self.generate_func = generate_func
+        self.batch_func = batch_func
+        self.batch_size = batch_size
+
+    def generate_embedding(self, text: str) -> np.ndarray:
+        if self.generate_func is not None:
+            return np.asarray(self.generate_func(text), dtype=np.float32)
+        return self.generate_embeddings([text])[0]
 
-    def generate_embedding(self, text: str) -> List[float]:
-        return self.generate_func(text)
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            if self.batch_func is not None:
+                batches.append(np.asarray(self.batch_func(batch), dtype=np.float32))
+            else:
+                batches.append(np.array([self.generate_func(text) for text in batch], dtype=np.float32))
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(batches)
 
 class EmbeddingFactory:
     @staticmethod
     def create_embedding_generator(config: Dict[str, Any]) -> EmbeddingGenerator:
         module_name = config['module']
-        function_name = config['function']
+        function_name = config.get('function')
+        batch_function_name = config.get('batch_function')
         params = config.get('params', {})
 
         try:
             module = importlib.import_module(module_name)
-            func = getattr(module, function_name)
+            func = getattr(module, function_name) if function_name else None
+            batch_func = getattr(module, batch_function_name) if batch_function_name else None
         except ImportError:
             logger.error(f"Failed to import module: {module_name}")
             raise
         except AttributeError:
-            logger.error(f"Function {function_name} not found in module {module_name}")
+            logger.error(f"Function {function_name or batch_function_name} not found in module {module_name}")
             raise
 
-        def generate_func(text: str) -> List[float]:
-            return func(text, **params)
+        generate_func = None
+        if func is not None:
+            def generate_func(text: str) -> Sequence[float]:
+                return func(text, **params)
+
+        generate_batch = None
+        if batch_func is not None:
+            def generate_batch(texts: List[str]) -> np.ndarray:
+                return batch_func(texts, **params)
 
-        return EmbeddingGenerator(generate_func)
+        return EmbeddingGenerator(generate_func, generate_batch, config.get('batch_size', 32))
 
 
+class ExtractedBlock(NamedTuple):
+    record: FileRecord
+    chunks: Optional[List[Chunk]]  # None when the file's content hash is unchanged
+    first: bool  # the file's old vectors are removed before this block is stored
+    last: bool   # the file's manifest entry is written with this block
+
 class EmbeddingProcessor:
-    def __init__(self, embedding_generator: EmbeddingGenerator, storage: FAISSStorage):
+    def __init__(self, embedding_generator: EmbeddingGenerator, storage: FAISSStorage,
+                 workers: int = 1, batch_size: int = 32, queue_size: int = 4,
+                 chunk_strategy: str = "file", chunk_size: int = 256, chunk_overlap: int = 32,
+                 metrics: Optional[IngestMetrics] = None):
         self.embedding_generator = embedding_generator
         self.storage = storage
+        self.workers = workers
+        self.batch_size = batch_size
+        # Bounds both the extracted documents waiting on the pool and the embedded
+        # batches waiting on the writer, so a slow stage throttles the ones before it.
+        self.queue_size = queue_size
+        self.chunk_strategy = chunk_strategy
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.metrics = metrics or IngestMetrics()
 
-    def process_input(self, input_path: str):
+    def chunk_file(self, file_path: str) -> Iterator[Chunk]:
+        return chunk_document(file_path, self.chunk_strategy, self.chunk_size, self.chunk_overlap)
+
+    def train_on_sample(self, input_paths: List[str], sample_size: int):
+        # IVF/PQ indexes need representative vectors before anything can be added.
+        file_paths = [file_path for input_path in input_paths for file_path in self.iter_files(input_path)]
+        sample_paths = random.sample(file_paths, min(sample_size, len(file_paths)))
+        logger.info(f"Training {self.storage.index_factory} index on up to {sample_size} chunks "
+                    f"from {len(sample_paths)} of {len(file_paths)} files")
+
+        sample = []
+        for file_path in sample_paths:
+            try:
+                chunks = itertools.islice(self.chunk_file(file_path), sample_size - len(sample))
+                texts = [chunk.text for chunk in chunks]
+                sample.extend(self.embedding_generator.generate_embeddings(texts))
+            except Exception as e:
+                logger.error(f"Error embedding training sample {file_path}: {str(e)}")
+            if len(sample) >= sample_size:
+                break
+        self.storage.train(sample)
+
+    def iter_files(self, input_path: str) -> Iterator[str]:
         if os.path.isfile(input_path):
-            self.process_file(input_path)
+            yield input_path
         elif os.path.isdir(input_path):
             for root, _, files in os.walk(input_path):
                 for file in files:
-                    file_path = os.path.join(root, file)
-                    self.process_file(file_path)
+                    yield os.path.join(root, file)
         else:
             logger.warning(f"Invalid input path: {input_path}")
 
+    def process_input(self, input_path: str):
+        for file_path in self.iter_files(input_path):
+            self.process_file(file_path)
+
+    def process_inputs(self, input_paths: List[str]):
+        """Run extract -> embed -> store as overlapping stages.
+
+        Text extraction and chunking run in a process pool, embedding runs on this
+        thread in batches of `batch_size` chunks, and a single writer thread owns
+        the storage. Workers return large documents a block of pages at a time, so
+        memory stays bounded by the batch size rather than the document size.
+        Files whose size, mtime or content hash match the manifest are skipped,
+        changed files replace their old vectors, and deleted files are purged.
+        """
+        known_files = self.storage.get_file_records()
+        seen_paths = set()
+        file_paths = (file_path for input_path in input_paths for file_path in self.iter_files(input_path))
+
+        store_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        # Files with a batch that failed to embed or store; shared with the writer.
+        failed_paths: set = set()
+        writer = threading.Thread(target=self._write_batches, args=(store_queue, failed_paths),
+                                  name="embedding-writer")
+        writer.start()
+        try:
+            batch: List[ExtractedBlock] = []
+            batch_chunks = 0
+            for block in self._extract_all(file_paths, known_files, seen_paths):
+                # Blocks can be larger than the room left in the batch; split them.
+                remaining: Optional[ExtractedBlock] = block
+                while remaining is not None:
+                    room = self.batch_size - batch_chunks
+                    if remaining.chunks and len(remaining.chunks) > room:
+                        batch.append(remaining._replace(chunks=remaining.chunks[:room], last=False))
+                        remaining = remaining._replace(chunks=remaining.chunks[room:], first=False)
+                    else:
+                        batch.append(remaining)
+                        remaining = None
+                    batch_chunks += len(batch[-1].chunks or ())
+                    if batch_chunks >= self.batch_size:
+                        self._embed_batch(batch, store_queue, failed_paths)
+                        batch = []
+                        batch_chunks = 0
+            if batch:
+                self._embed_batch(batch, store_queue, failed_paths)
+        finally:
+            store_queue.put(None)
+            writer.join()
+
+        deleted_paths = [path for path in known_files if path not in seen_paths and not os.path.exists(path)]
+        if deleted_paths:
+            self.storage.forget_files(deleted_paths)
+            self.metrics.inc('files_purged', len(deleted_paths))
+            logger.info(f"Purged {len(deleted_paths)} deleted files")
+        self.metrics.maybe_emit()
+
+    def _changed_files(self, file_paths: Iterable[str], known_files: Dict[str, FileRecord],
+                       seen_paths: set) -> Iterator[Tuple[str, os.stat_result]]:
+        for file_path in file_paths:
+            seen_paths.add(file_path)
+            self.metrics.inc('files_seen')
+            try:
+                stat = os.stat(file_path)
+            except OSError as e:
+                self.metrics.record_failure('stat', e)
+                logger.error(f"Error processing {file_path}: {str(e)}")
+                continue
+            known = known_files.get(file_path)
+            if known and known.mtime == stat.st_mtime and known.size == stat.st_size:
+                self.metrics.inc('files_unchanged')
+                logger.debug(f"Unchanged: {file_path}")
+                continue
+            yield file_path, stat
+
+    def _extract_all(self, file_paths: Iterable[str], known_files: Dict[str, FileRecord],
+                     seen_paths: set) -> Iterator[ExtractedBlock]:
+        candidates = self._changed_files(file_paths, known_files, seen_paths)
+        if self.workers <= 1:
+            for file_path, stat in candidates:
+                record, start_page = None, 1
+                while start_page is not None:
+                    func, args = self._extract_call(file_path, known_files, record, start_page)
+                    try:
+                        result = func(*args)
+                    except Exception as e:
+                        self.metrics.record_failure('extract', e)
+                        logger.error(f"Error processing {file_path}: {str(e)}")
+                        break
+                    block, next_page = self._extracted(file_path, stat, record, start_page, result)
+                    record = block.record
+                    yield block
+                    start_page = next_page
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            in_flight: deque = deque()
+
+            def submit(file_path: str, stat: os.stat_result, record: Optional[FileRecord], start_page: int):
+                func, args = self._extract_call(file_path, known_files, record, start_page)
+                in_flight.append((file_path, stat, record, start_page, pool.submit(func, *args)))
+                self.metrics.set_gauge('extract_in_flight', len(in_flight))
+
+            for file_path, stat in candidates:
+                submit(file_path, stat, None, 1)
+                if len(in_flight) >= self.workers * self.queue_size:
+                    yield from self._collect(in_flight.popleft(), submit)
+            while in_flight:
+                yield from self._collect(in_flight.popleft(), submit)
+
+    def _extract_call(self, file_path: str, known_files: Dict[str, FileRecord], record: Optional[FileRecord],
+                      start_page: int) -> Tuple[Callable, tuple]:
+        # The first call hashes the file; later ones continue a large document from `start_page`.
+        chunk_args = (self.chunk_strategy, self.chunk_size, self.chunk_overlap)
+        if record is None:
+            return timed_chunk_if_changed, (file_path, self._known_hash(known_files, file_path), *chunk_args,
+                                            self.batch_size)
+        return timed_chunk_block, (file_path, *chunk_args, start_page, self.batch_size)
+
+    def _collect(self, entry: Tuple[str, os.stat_result, Optional[FileRecord], int, Future],
+                 submit: Callable) -> Iterator[ExtractedBlock]:
+        file_path, stat, record, start_page, future = entry
+        try:
+            result = future.result()
+        except Exception as e:
+            self.metrics.record_failure('extract', e)
+            logger.error(f"Error processing {file_path}: {str(e)}")
+            return
+        block, next_page = self._extracted(file_path, stat, record, start_page, result)
+        if next_page is not None:
+            # The next block queues behind the files already in flight.
+            submit(file_path, stat, block.record, next_page)
+        yield block
+
+    def _extracted(self, file_path: str, stat: os.stat_result, record: Optional[FileRecord], start_page: int,
+                   result: tuple) -> Tuple[ExtractedBlock, Optional[int]]:
+        if record is None:
+            content_hash, chunks, next_page, seconds = result
+            record = self._file_record(file_path, stat, content_hash)
+            self.metrics.inc('bytes_processed', stat.st_size)
+        else:
+            chunks, next_page, seconds = result
+        self.metrics.observe('extract', seconds)
+        if chunks is None:
+            self.metrics.inc('files_content_unchanged')
+        else:
+            self.metrics.inc('chunks_extracted', len(chunks))
+        return ExtractedBlock(record, chunks, start_page == 1, next_page is None), next_page
+
+    @staticmethod
+    def _known_hash(known_files: Dict[str, FileRecord], file_path: str) -> Optional[str]:
+        known = known_files.get(file_path)
+        return known.content_hash if known else None
+
+    @staticmethod
+    def _file_record(file_path: str, stat: os.stat_result, content_hash: str) -> FileRecord:
+        return FileRecord(file_path, content_hash, stat.st_mtime, stat.st_size)
+
+    def _embed_batch(self, batch: List[ExtractedBlock], store_queue: queue.Queue, failed_paths: set):
+        # Once a batch of a file fails, the rest of the file is dropped and its manifest
+        # entry is never written, so the whole file is processed again next run.
+        batch = [block for block in batch if block.record.path not in failed_paths]
+        if not batch:
+            return
+        chunks = [chunk for block in batch if block.chunks for chunk in block.chunks]
+        # Old vectors go before a changed file's first block is stored, which also clears
+        # any left by a run that failed part-way through the file. Its manifest entry is
+        # only written with the last block.
+        # Files whose content hash is unchanged only need their manifest entry refreshed.
+        stale_paths = [block.record.path for block in batch if block.first and block.chunks is not None]
+        finished = [block.record for block in batch if block.last]
+        try:
+            with self.metrics.time('embed'):
+                embeddings = self.embedding_generator.generate_embeddings([chunk.text for chunk in chunks])
+        except Exception as e:
+            self.metrics.record_failure('embed', e)
+            logger.error(f"Error embedding batch starting at {batch[0].record.path}: {str(e)}")
+            failed_paths.update(block.record.path for block in batch)
+            return
+        self.metrics.inc('chunks_embedded', len(chunks))
+        # Depth seen by the producer: a full queue means the writer is the bottleneck.
+        self.metrics.set_gauge('store_queue_depth', store_queue.qsize())
+        store_queue.put((finished, stale_paths, chunks, embeddings))
+
+    def _write_batches(self, store_queue: queue.Queue, failed_paths: set):
+        while True:
+            item: Optional[Tuple[List[FileRecord], List[str], List[Chunk], Any]] = store_queue.get()
+            if item is None:
+                return
+            records, stale_paths, chunks, embeddings = item
+            if failed_paths:
+                # Batches embedded before an earlier store of the same file failed.
+                keep = [row for row, chunk in enumerate(chunks) if chunk.path not in failed_paths]
+                if len(keep) < len(chunks):
+                    chunks = [chunks[row] for row in keep]
+                    embeddings = np.asarray(embeddings)[keep]
+                records = [record for record in records if record.path not in failed_paths]
+                stale_paths = [path for path in stale_paths if path not in failed_paths]
+            try:
+                # Includes any index flush the write triggers; that is also timed as "flush".
+                with self.metrics.time('store'):
+                    self.storage.remove_paths(stale_paths)
+                    self.storage.store_embeddings(
+                        [chunk.path for chunk in chunks],
+                        embeddings,
+                        [(chunk.page, chunk.offset) for chunk in chunks]
+                    )
+                    self.storage.record_files(records)
+                self.metrics.inc('files_stored', len(records))
+                self.metrics.inc('vectors_stored', len(chunks))
+                for record in records:
+                    logger.info(f"Processed: {record.path}")
+            except Exception as e:
+                self.metrics.record_failure('store', e)
+                logger.error(f"Error storing batch starting at {(chunks or records)[0].path}: {str(e)}")
+                failed_paths.update(stale_paths)
+                failed_paths.update(chunk.path for chunk in chunks)
+                failed_paths.update(record.path for record in records)
+            self.metrics.maybe_emit()
+
     def process_file(self, file_path: str):
         try:
-            if file_path.lower().endswith('.pdf'):
-                with open(file_path, 'rb') as file:
-                    reader = PyPDF2.PdfReader(file)
-                    content = ' '.join(page.extract_text() for page in reader.pages)
-            else:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
-        
-            embedding = self.embedding_generator.generate_embedding(content)
-            self.storage.store_embedding(file_path, embedding)
+            chunk_iter = self.chunk_file(file_path)
+            while True:
+                chunks = list(itertools.islice(chunk_iter, self.batch_size))
+                if not chunks:
+                    break
+                embeddings = self.embedding_generator.generate_embeddings([chunk.text for chunk in chunks])
+                self.storage.store_embeddings(
+                    [chunk.path for chunk in chunks],
+                    embeddings,
+                    [(chunk.page, chunk.offset) for chunk in chunks]
+                )
             logger.info(f"Processed: {file_path}")
         except Exception as e:
             logger.error(f"Error processing {file_path}: {str(e)}")
@@ -129,18 +485,89 @@ def load_config(config_path: str) -> Dict[str, Any]:
         raise
 
 
+def check_embedding_generator(embedding_generator: EmbeddingGenerator, dimension: int):
+    # Embed one text up front so a missing model file or a wrong dimension stops the run,
+    # rather than failing every batch and finishing with no vectors.
+    probe = embedding_generator.generate_embeddings(["embedding check"])
+    if probe.shape != (1, dimension):
+        raise ValueError(f"Embedding function returned vectors of shape {probe.shape[1:]}, "
+                         f"but embedding_dimension is {dimension}")
+
+
+def create_metrics(metrics_config: Dict[str, Any]) -> IngestMetrics:
+    sinks = []
+    if 'prometheus_path' in metrics_config:
+        sinks.append(PrometheusTextFileSink(metrics_config['prometheus_path']))
+    if 'jsonl_path' in metrics_config:
+        sinks.append(JsonLinesSink(metrics_config['jsonl_path']))
+    return IngestMetrics(sinks, metrics_config.get('emit_interval', 30.0))
+
+
 def main(config_path: str):
     try:
         config = load_config(config_path)
         embedding_generator = EmbeddingFactory.create_embedding_generator(config['embedding'])
-        storage = FAISSStorage(config['faiss_index_path'], config['embedding_dimension'])
-        processor = EmbeddingProcessor(embedding_generator, storage)
+        check_embedding_generator(embedding_generator, config['embedding_dimension'])
+        cache = None
+        if 'cache' in config:
+            cache = EmbeddingCache(
+                config['cache']['path'],
+                model_key(config['embedding']),
+                config['cache'].get('max_bytes', 1 << 30)
+            )
+            embedding_generator = CachingEmbeddingGenerator(embedding_generator, cache)
+        metrics_config = config.get('metrics', {})
+        metrics = create_metrics(metrics_config)
+        storage_config = config.get('storage', {})
+        index_config = config.get('index', {})
+        with open_storage(
+            config['faiss_index_path'],
+            config['embedding_dimension'],
+            shards=storage_config.get('shards', 1),
+            flush_every=storage_config.get('flush_every', 1000),
+            flush_interval=storage_config.get('flush_interval', 60.0),
+            index_factory=index_config.get('factory', 'Flat'),
+            search_params=index_config.get('search_params'),
+            metrics=metrics,
+            rerank_factor=index_config.get('rerank_factor')
+        ) as storage:
+            pipeline_config = config.get('pipeline', {})
+            chunking_config = config.get('chunking', {})
+            processor = EmbeddingProcessor(
+                embedding_generator,
+                storage,
+                workers=pipeline_config.get('workers', os.cpu_count() or 1),
+                batch_size=pipeline_config.get('batch_size', 32),
+                queue_size=pipeline_config.get('queue_size', 4),
+                chunk_strategy=chunking_config.get('strategy', 'file'),
+                chunk_size=chunking_config.get('size', 256),
+                chunk_overlap=chunking_config.get('overlap', 32),
+                metrics=metrics
+            )
+
+            # Profiles this thread only (training and embedding); extraction workers
+            # and the writer thread show up in the stage histograms instead.
+            profiler = cProfile.Profile() if 'profile_path' in metrics_config else None
+            if profiler is not None:
+                profiler.enable()
+            try:
+                input_paths = config['input_paths']
+                if not storage.is_trained:
+                    with metrics.time('train'):
+                        processor.train_on_sample(input_paths, index_config.get('train_size', 10000))
+                processor.process_inputs(input_paths)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    profiler.dump_stats(metrics_config['profile_path'])
+                    logger.info(f"Wrote profile to {metrics_config['profile_path']}")
 
-        input_paths = config['input_paths']
-        for input_path in input_paths:
-            processor.process_input(input_path)
-        
+        metrics.emit()
         logger.info(f"Total embeddings stored: {len(storage)}")
+        logger.info(f"Stage seconds: {metrics.stage_seconds()}")
+        if cache is not None:
+            logger.info(f"Embedding cache: {cache.stats()}")
+            cache.close()
     except Exception as e:
         logger.error(f"An error occurred during execution: {str(e)}")
         raise
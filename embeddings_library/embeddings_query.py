@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import TCPServer
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from embeddings_generator import EmbeddingFactory, load_config, logger
+from faiss_storage import open_storage
+from metadata_store import FILTER_KEYS
+
+
+class EmbeddingSearcher:
+    """Keeps the embedding model and a memory-mapped index resident between queries."""
+
+    def __init__(self, config: Dict[str, Any], latency_window: int = 10000):
+        self.embedding_generator = EmbeddingFactory.create_embedding_generator(config['embedding'])
+        self.storage = open_storage(
+            config['faiss_index_path'],
+            config['embedding_dimension'],
+            shards=config.get('storage', {}).get('shards', 1),
+            search_params=config.get('index', {}).get('search_params'),
+            read_only=True,
+            rerank_factor=config.get('index', {}).get('rerank_factor')
+        )
+        self.latencies_ms: deque = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+
+    def search(self, queries: List[str], k: int = 5, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        start = time.perf_counter()
+        # The embedding function and the sidecar connection are shared across request threads.
+        with self._lock:
+            embeddings = self.embedding_generator.generate_embeddings(queries)
+            results = self.storage.search_many(embeddings, k, filters=filters)
+            hits = [results.results(row) for row in range(len(results))]
+            latency_ms = 1000 * (time.perf_counter() - start)
+            self.latencies_ms.append(latency_ms)
+        return {"results": hits, "latency_ms": latency_ms, **self.latency_stats()}
+
+    def latency_stats(self) -> Dict[str, float]:
+        if not self.latencies_ms:
+            return {"p50_ms": 0.0, "p99_ms": 0.0}
+        p50, p99 = np.percentile(self.latencies_ms, [50, 99])
+        return {"p50_ms": float(p50), "p99_ms": float(p99)}
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    searcher: EmbeddingSearcher = None
+
+    def do_POST(self):
+        if self.path != '/search':
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            queries = body['queries'] if 'queries' in body else [body['query']]
+            response = self.searcher.search(queries, int(body.get('k', 5)), body.get('filters'))
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": f"Invalid request: {str(e)}"})
+            return
+        except Exception as e:
+            logger.error(f"Error serving search: {str(e)}")
+            self._send_json(500, {"error": str(e)})
+            return
+        logger.info(f"Served {len(queries)} queries in {response['latency_ms']:.2f} ms "
+                    f"(p50 {response['p50_ms']:.2f} ms, p99 {response['p99_ms']:.2f} ms)")
+        self._send_json(200, response)
+
+    def do_GET(self):
+        if self.path != '/stats':
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        self._send_json(200, {"vectors": len(self.searcher.storage), **self.searcher.latency_stats()})
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no host/port.
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def serve(config_path: str, host: str, port: int, unix_socket: str = None):
+    SearchRequestHandler.searcher = EmbeddingSearcher(load_config(config_path))
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = UnixHTTPServer(unix_socket, SearchRequestHandler)
+        logger.info(f"Serving searches on unix socket {unix_socket}")
+    else:
+        server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+        logger.info(f"Serving searches on http://{host}:{port}/search")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_timestamp(value: str) -> float:
+    # Unix seconds or an ISO 8601 date / datetime.
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def query(config_path: str, queries: List[str], k: int, as_json: bool, filters: Optional[Dict[str, Any]] = None):
+    searcher = EmbeddingSearcher(load_config(config_path))
+    response = searcher.search(queries, k, filters)
+    if as_json:
+        print(json.dumps(response, indent=2))
+        return
+    for text, hits in zip(queries, response['results']):
+        print(f"Query: {text}")
+        for rank, hit in enumerate(hits, start=1):
+            print(f"  {rank}. {hit['file_path']} (page {hit['page']}, offset {hit['offset']}) distance={hit['distance']:.4f}")
+    print(f"Searched {len(queries)} queries in {response['latency_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search an embeddings index built from a YAML configuration.")
+    parser.add_argument("--log", help="Log level (DEBUG, INFO, WARNING, ERROR, CRITICAL)", default="INFO")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    query_parser = subparsers.add_parser("query", help="Run one batch of queries and print the top-k results")
+    query_parser.add_argument("config", help="Path to the YAML configuration file")
+    query_parser.add_argument("queries", nargs="+", help="Query texts")
+    query_parser.add_argument("-k", type=int, default=5, help="Number of results per query")
+    query_parser.add_argument("--json", action="store_true", help="Print the raw JSON response")
+    query_parser.add_argument("--source-dir", help="Only search files under this directory")
+    query_parser.add_argument("--file-type", action="append", help="Only search files with this extension (repeatable)")
+    query_parser.add_argument("--modified-after", type=parse_timestamp, help="Only files modified at or after this time")
+    query_parser.add_argument("--modified-before", type=parse_timestamp, help="Only files modified before this time")
+
+    serve_parser = subparsers.add_parser("serve", help="Keep the model and index loaded and serve searches over HTTP")
+    serve_parser.add_argument("config", help="Path to the YAML configuration file")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    serve_parser.add_argument("--socket", help="Listen on this unix socket path instead of TCP")
+
+    args = parser.parse_args()
+    logger.setLevel(args.log.upper())
+
+    if args.command == "query":
+        filters = {name: getattr(args, name) for name in FILTER_KEYS if getattr(args, name) is not None}
+        query(args.config, args.queries, args.k, args.json, filters)
+    else:
+        serve(args.config, args.host, args.port, args.socket)
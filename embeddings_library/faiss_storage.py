@@ -1,56 +1,698 @@
 import faiss
+import heapq
+import itertools
+import logging
 import numpy as np
 import os
-from typing import List, Dict, Any
+import re
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+from metadata_store import FILTER_KEYS, FileRecord, MetadataStore
+
+logger = logging.getLogger(__name__)
+
+# Filtered searches keep the selectors of this many recent filter combinations.
+FILTER_CACHE_SIZE = 16
+
+class SearchResults:
+    """Top-k ids and distances for a batch of queries.
+
+    Paths and chunk locations are only looked up in the metadata sidecar when
+    first asked for.
+    """
+
+    def __init__(self, ids: np.ndarray, distances: np.ndarray, metadata: MetadataStore):
+        self.ids = ids
+        self.distances = distances
+        self._metadata = metadata
+        self._locations: Optional[Dict[int, Tuple[str, int, int]]] = None
+
+    def locations(self) -> Dict[int, Tuple[str, int, int]]:
+        """Map each returned id to its (path, page, offset)."""
+        if self._locations is None:
+            found = self.ids[self.ids != -1]  # FAISS uses -1 for empty slots
+            self._locations = self._metadata.get_locations(found.tolist())
+        return self._locations
+
+    def paths(self) -> np.ndarray:
+        locations = self.locations()
+        return np.array(
+            [[locations[idx][0] if idx in locations else None for idx in row] for row in self.ids.tolist()],
+            dtype=object
+        ).reshape(self.ids.shape)
+
+    def results(self, row: int) -> List[Dict[str, Any]]:
+        locations = self.locations()
+        results = []
+        for idx, dist in zip(self.ids[row].tolist(), self.distances[row].tolist()):
+            if idx in locations:  # skips empty slots and vectors of removed files
+                path, page, offset = locations[idx]
+                results.append({"file_path": path, "page": page, "offset": offset, "distance": float(dist)})
+        return results
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+def exact_rerank(queries: np.ndarray, distances: np.ndarray, ids: np.ndarray, vectors: np.ndarray, k: int,
+                 inner_product: bool = False, has_row: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Re-score candidate ids against full-precision `vectors` (row = id) and keep the best `k`.
+
+    `has_row` marks the candidates whose row was actually written (default: every id
+    within `vectors`); the rest keep the index's approximate distance.
+    """
+    exact = (ids >= 0) & (ids < len(vectors))
+    if has_row is not None:
+        exact &= has_row
+    candidates = vectors[np.where(exact, ids, 0)]
+    if inner_product:
+        rescored = np.einsum('qkd,qd->qk', candidates, queries)
+    else:
+        rescored = ((candidates - queries[:, None, :]) ** 2).sum(axis=2)
+    rescored = np.where(exact, rescored, distances).astype(np.float32)
+    # Empty slots (-1) sort last.
+    rescored[ids < 0] = -np.inf if inner_product else np.inf
+    order = np.argsort(-rescored if inner_product else rescored, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(rescored, order, axis=1), np.take_along_axis(ids, order, axis=1)
 
 class FAISSStorage:
-    def __init__(self, index_path: str, dimension: int):
+    def __init__(self, index_path: str, dimension: int, flush_every: int = 1, flush_interval: Optional[float] = None,
+                 index_factory: str = "Flat", search_params: Optional[Dict[str, Any]] = None,
+                 read_only: bool = False, metrics=None, rerank_factor: Optional[int] = None):
         self.index_path = index_path
         self.dimension = dimension
+        # Any faiss.index_factory string: "Flat", "IVF1024,Flat", "HNSW32", "IVF1024,PQ16",
+        # or a compressed encoding such as "SQfp16", "SQ8" or "PQ32".
+        self.index_factory = index_factory
+        # Write-behind: the index is only persisted once `flush_every` vectors are
+        # pending or `flush_interval` seconds have passed since the last flush.
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        # Read-only stores memory-map an existing index instead of loading it into RAM.
+        self.read_only = read_only
         self.index = self._load_or_create_index()
-        self.id_to_path: Dict[int, str] = {}
-        self.next_id = 0
+        # id -> path mapping lives in a sidecar next to the index so it survives restarts.
+        self.metadata = MetadataStore(f"{os.path.splitext(index_path)[0]}.meta.db")
+        # With a compressed index, a full-precision copy of each vector (row = id) is kept
+        # beside it; searches fetch k * rerank_factor candidates and re-rank them exactly.
+        self.rerank_factor = rerank_factor
+        self.vectors_path = f"{os.path.splitext(index_path)[0]}.vectors.f32"
+        self._vectors_file = None
+        self._vectors_view: Optional[np.ndarray] = None
+        self._vector_rows: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.next_id = None if read_only else self._resume_next_id()
+        self._pending = 0
+        # Manifest entries waiting for the index write that makes their vectors durable.
+        self._pending_files: Dict[str, FileRecord] = {}
+        self._last_flush = time.monotonic()
+        # Cleared the first time the index turns down an id selector; see _search.
+        self._selectors_supported = True
+        # filter key -> (allowed ids, search parameters, selector), dropped on every write.
+        self._filter_cache: Dict[Tuple, Tuple[np.ndarray, Any, Any]] = {}
+        # Optional IngestMetrics; index writes are timed as the "flush" stage.
+        self.metrics = metrics
+        if search_params:
+            self.set_search_params(**search_params)
 
     def _load_or_create_index(self):
-        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        if self.read_only:
+            if not os.path.exists(self.index_path):
+                raise FileNotFoundError(f"Index not found: {self.index_path}")
+            return faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
         if os.path.exists(self.index_path):
-            return faiss.read_index(self.index_path)
+            index = faiss.read_index(self.index_path)
+            ivf = faiss.try_extract_index_ivf(index)
+            if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+                ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return index
         else:
-            index = faiss.IndexFlatL2(self.dimension)
-            faiss.write_index(index, self.index_path)
+            index = faiss.index_factory(self.dimension, self.index_factory)
+            # Explicit ids let vectors be removed without renumbering the rest. IVF
+            # indexes keep ids themselves (plus a hashtable for reconstruct/remove);
+            # everything else is wrapped in an id map.
+            ivf = faiss.try_extract_index_ivf(index)
+            if ivf is not None:
+                ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+            else:
+                index = faiss.IndexIDMap2(index)
+            self._write_index(index)
             return index
 
+    def _id_map_index(self):
+        index = faiss.downcast_index(self.index)
+        return index if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else None
+
+    @property
+    def supports_ids(self) -> bool:
+        # False only for indexes written before ids were explicit, where id == position.
+        return self._id_map_index() is not None or faiss.try_extract_index_ivf(self.index) is not None
+
+    def _resume_next_id(self) -> int:
+        if not self.supports_ids:
+            return self.index.ntotal
+        max_stored = self.metadata.max_id()
+        vector_ids = self._vector_ids()
+        max_indexed = int(vector_ids.max()) if len(vector_ids) else -1
+        return max(max_indexed, -1 if max_stored is None else max_stored) + 1
+
+    @property
+    def is_trained(self) -> bool:
+        return self.index.is_trained
+
+    def train(self, sample: Union[np.ndarray, Sequence[List[float]]]):
+        matrix = np.ascontiguousarray(sample, dtype=np.float32).reshape(-1, self.dimension)
+        self.index.train(matrix)
+        self._write_index(self.index)
+
+    def set_search_params(self, **params):
+        # ParameterSpace resolves names like nprobe / efSearch through wrapper indexes.
+        parameter_space = faiss.ParameterSpace()
+        for name, value in params.items():
+            parameter_space.set_index_parameter(self.index, name, value)
+        # Cached filter parameters carry the old nprobe / efSearch.
+        self._filter_cache.clear()
+
     def store_embedding(self, file_path: str, embedding: List[float]):
-        embedding_np = np.array([embedding], dtype=np.float32)
-        self.index.add(embedding_np)
-        self.id_to_path[self.next_id] = file_path
-        self.next_id += 1
-        self._save_index()
+        self.store_embeddings([file_path], [embedding])
+
+    def store_embeddings(self, file_paths: Sequence[str], embeddings: Union[np.ndarray, Sequence[List[float]]],
+                         locations: Optional[Sequence[Tuple[int, int]]] = None):
+        """Add one vector per entry of `file_paths`; `locations` gives each vector's (page, offset)."""
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        if matrix.shape[0] != len(file_paths):
+            raise ValueError(f"Got {len(file_paths)} paths for {matrix.shape[0]} embeddings")
+        if matrix.shape[0] == 0:
+            return
+        if self.read_only:
+            raise RuntimeError(f"Index {self.index_path} was opened read-only")
+        if not self.is_trained:
+            raise RuntimeError(f"Index {self.index_factory} must be trained before adding embeddings")
+
+        ids = np.arange(self.next_id, self.next_id + matrix.shape[0], dtype=np.int64)
+        if locations is None:
+            locations = [(1, 0)] * len(file_paths)
+        self.metadata.add_vectors(
+            (vector_id, file_path, page, offset)
+            for vector_id, file_path, (page, offset) in zip(ids.tolist(), file_paths, locations)
+        )
+        if self.rerank_factor:
+            self._write_full_precision(ids, matrix)
+        if self.supports_ids:
+            self.index.add_with_ids(matrix, ids)
+        else:
+            self.index.add(matrix)
+        self.next_id += matrix.shape[0]
+        self._filter_cache.clear()
+        self._pending += matrix.shape[0]
+        self._maybe_flush()
+
+    def _write_full_precision(self, ids: np.ndarray, matrix: np.ndarray):
+        if self._vectors_file is None:
+            self._vectors_file = open(self.vectors_path, 'r+b' if os.path.exists(self.vectors_path) else 'w+b')
+        # Ids are allocated contiguously, so one write covers the batch; rows of removed
+        # vectors are left in place since ids are never reused.
+        self._vectors_file.seek(int(ids[0]) * self.dimension * 4)
+        self._vectors_file.write(matrix.tobytes())
+        # Rows before the first write, or for vectors added while re-ranking was off, are
+        # zero-filled holes; only the recorded ranges are re-scored.
+        self.metadata.add_full_precision_rows(int(ids[0]), int(ids[-1]) + 1)
+        self._vector_rows = None
+
+    def _has_full_precision_row(self, ids: np.ndarray) -> np.ndarray:
+        if self._vector_rows is None:
+            ranges = np.array(self.metadata.get_full_precision_rows(), dtype=np.int64).reshape(-1, 2)
+            self._vector_rows = (ranges[:, 0], ranges[:, 1])
+        starts, stops = self._vector_rows
+        if not len(starts):
+            return np.zeros(ids.shape, dtype=bool)
+        position = np.searchsorted(starts, ids, side='right') - 1
+        return (position >= 0) & (ids < stops[np.maximum(position, 0)])
+
+    def _full_precision_vectors(self) -> Optional[np.ndarray]:
+        if self._vectors_file is not None:
+            self._vectors_file.flush()
+        if not os.path.exists(self.vectors_path):
+            return None
+        rows = os.path.getsize(self.vectors_path) // (self.dimension * 4)
+        if self._vectors_view is None or self._vectors_view.shape[0] != rows:
+            self._vectors_view = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                           shape=(rows, self.dimension)) if rows else None
+        return self._vectors_view
+
+    def remove_paths(self, file_paths: Sequence[str]) -> int:
+        ids = self.metadata.get_ids_for_paths(file_paths)
+        if not ids:
+            return 0
+        if self.read_only:
+            raise RuntimeError(f"Index {self.index_path} was opened read-only")
+        if self.supports_ids:
+            try:
+                self.index.remove_ids(np.array(ids, dtype=np.int64))
+            except RuntimeError as e:
+                # e.g. HNSW: the vectors stay in the index but lose their paths,
+                # so they are dropped from search results.
+                logger.warning(f"Index does not support removal, masking {len(ids)} vectors: {e}")
+        self.metadata.delete_ids(ids)
+        self._filter_cache.clear()
+        self._pending += len(ids)
+        self._maybe_flush()
+        return len(ids)
+
+    def get_file_records(self) -> Dict[str, FileRecord]:
+        return {**self.metadata.get_file_records(), **self._pending_files}
+
+    def record_files(self, records: Sequence[FileRecord]):
+        # Written at the next flush, once the index holds the files' vectors.
+        self._pending_files.update((record.path, record) for record in records)
+
+    def forget_files(self, file_paths: Sequence[str]):
+        self.remove_paths(file_paths)
+        for file_path in file_paths:
+            self._pending_files.pop(file_path, None)
+        self.metadata.delete_files(file_paths)
+
+    def _maybe_flush(self):
+        interval_elapsed = (
+            self.flush_interval is not None
+            and time.monotonic() - self._last_flush >= self.flush_interval
+        )
+        if self._pending >= self.flush_every or interval_elapsed:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            if self.metrics is not None:
+                with self.metrics.time('flush'):
+                    self._save_index()
+                self.metrics.inc('flushes')
+            else:
+                self._save_index()
+        self._pending = 0
+        # With nothing pending, the vectors of any recorded files are already on disk.
+        self._commit_file_records()
+        self._last_flush = time.monotonic()
 
     def _save_index(self):
-        faiss.write_index(self.index, self.index_path)
+        # Commit the mapping first: rows for ids the index never received are harmless
+        # (ids are not reused), whereas vectors without paths are not. The same goes for
+        # full-precision rows, which are synced before either. Manifest entries are not
+        # harmless, since they make the next run skip their files, so they are committed
+        # by flush() only after the index has been replaced.
+        if self._vectors_file is not None:
+            self._vectors_file.flush()
+            os.fsync(self._vectors_file.fileno())
+        self.metadata.commit()
+        self._write_index(self.index)
 
-    def search_similar(self, query_embedding: List[float], k: int = 5) -> List[Dict[str, Any]]:
-        query_np = np.array([query_embedding], dtype=np.float32)
-        distances, indices = self.index.search(query_np, k)
-        
-        results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            if idx != -1:  # FAISS uses -1 for empty slots
-                results.append({
-                    "file_path": self.id_to_path[idx],
-                    "distance": float(dist)
-                })
-        
-        return results
+    def _commit_file_records(self):
+        if self._pending_files:
+            self.metadata.record_files(self._pending_files.values())
+            self.metadata.commit()
+            self._pending_files.clear()
+
+    def _write_index(self, index):
+        # Write to a temp file and rename over the old index so a crash mid-write
+        # never leaves a truncated index behind.
+        tmp_path = f"{self.index_path}.tmp"
+        faiss.write_index(index, tmp_path)
+        with open(tmp_path, 'rb+') as tmp_file:
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def search_many(self, queries: Union[np.ndarray, Sequence[List[float]]], k: int = 5,
+                    rerank_factor: Optional[int] = None, filters: Optional[Dict[str, Any]] = None) -> SearchResults:
+        """Top-k for each query; `rerank_factor` overrides the store's setting (0 disables re-ranking).
+
+        `filters` (source_dir, file_type, modified_after, modified_before) restrict the
+        search to matching vectors inside FAISS, so every query still gets up to k hits.
+        """
+        queries_np = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        params = allowed = None
+        if filters:
+            allowed, params, _ = self._filter(filters)
+            if not len(allowed):
+                return SearchResults(np.full((len(queries_np), k), -1, dtype=np.int64),
+                                     np.full((len(queries_np), k), np.inf, dtype=np.float32), self.metadata)
+        rerank_factor = self.rerank_factor if rerank_factor is None else rerank_factor
+        vectors = self._full_precision_vectors() if rerank_factor else None
+        if vectors is None:
+            distances, indices = self._search(queries_np, k, params, allowed)
+        else:
+            distances, indices = self._search(queries_np, k * rerank_factor, params, allowed)
+            distances, indices = exact_rerank(queries_np, distances, indices, vectors, k,
+                                              self.index.metric_type == faiss.METRIC_INNER_PRODUCT,
+                                              self._has_full_precision_row(indices))
+        return SearchResults(indices, distances, self.metadata)
+
+    def _filter(self, filters: Dict[str, Any]) -> Tuple[np.ndarray, Any, Any]:
+        """Ids matching `filters`, the search parameters selecting them and their selector.
+
+        They are cached per filter combination until the next write, so repeated filters
+        skip the sidecar query and the selector build.
+        """
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown search filters: {sorted(unknown)}")
+        key = tuple((name, tuple(value) if isinstance(value, (list, tuple)) else value)
+                    for name, value in sorted(filters.items()) if value is not None)
+        cached = self._filter_cache.pop(key, None)
+        if cached is None:
+            allowed = np.array(self.metadata.find_ids(**filters), dtype=np.int64)
+            # The parameters only hold a pointer to the selector, so it is cached beside them.
+            selector = faiss.IDSelectorBatch(allowed) if len(allowed) else None
+            cached = (allowed, self._search_parameters(selector) if selector is not None else None, selector)
+            if len(self._filter_cache) >= FILTER_CACHE_SIZE:
+                del self._filter_cache[next(iter(self._filter_cache))]
+        # Re-inserted so the dict stays in least-recently-used order.
+        self._filter_cache[key] = cached
+        return cached
+
+    def _search(self, queries: np.ndarray, k: int, params=None,
+                allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if params is None:
+            return self.index.search(queries, k)
+        if self._selectors_supported:
+            try:
+                return self.index.search(queries, k, params=params)
+            except RuntimeError as e:
+                # e.g. IndexPQ and IndexLSH reject id selectors.
+                logger.info(f"Index {self.index_factory} cannot pre-filter, searching filtered ids directly: {e}")
+                self._selectors_supported = False
+        return self._search_subset(queries, k, allowed)
+
+    def _search_subset(self, queries: np.ndarray, k: int, allowed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact search over the reconstructions of the `allowed` ids.
+
+        For flat encodings such as PQ this gives the same distances as the index's own
+        search, which scores each query against the decoded vectors.
+        """
+        try:
+            vectors = self.index.reconstruct_batch(allowed)
+        except RuntimeError as e:
+            raise ValueError(f"Index {self.index_factory} supports neither id selectors nor reconstruction, "
+                             f"so it cannot be searched with filters") from e
+        inner_product = self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+        found_distances, positions = faiss.knn(queries, vectors, min(k, len(allowed)), metric=self.index.metric_type)
+        distances = np.full((len(queries), k), -np.inf if inner_product else np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        found = positions >= 0
+        distances[:, :positions.shape[1]] = np.where(found, found_distances, distances[:, :positions.shape[1]])
+        ids[:, :positions.shape[1]] = np.where(found, allowed[np.maximum(positions, 0)], -1)
+        return distances, ids
+
+    def _search_parameters(self, selector):
+        # Explicit parameters replace the index's own, so carry over nprobe / efSearch.
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+        inner = faiss.downcast_index(self.index)
+        # Id maps and pre-transforms (PCA, OPQ) hand the parameters to the index they wrap.
+        while isinstance(inner, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexPreTransform)):
+            inner = faiss.downcast_index(inner.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+        if isinstance(inner, faiss.IndexPQ):
+            # IndexPQ rejects the base SearchParameters.
+            return faiss.SearchParametersPQ(sel=selector, search_type=inner.search_type,
+                                            polysemous_ht=inner.polysemous_ht)
+        return faiss.SearchParameters(sel=selector)
+
+    def search_similar(self, query_embedding: List[float], k: int = 5,
+                       filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self.search_many([query_embedding], k, filters=filters).results(0)
 
-    def get_all_embeddings(self) -> Dict[str, List[float]]:
-        all_embeddings = {}
-        for i in range(self.index.ntotal):
-            embedding = self.index.reconstruct(i)
-            file_path = self.id_to_path[i]
-            all_embeddings[file_path] = embedding.tolist()
-        return all_embeddings
+    def export_embeddings(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return every vector as one (ntotal, dimension) float32 matrix plus a path array.
+
+        For flat indexes the matrix is a view onto the index's own buffer (no copy), so it
+        is only valid until the next add.
+        """
+        vector_ids = self._vector_ids()
+        return self._vectors_at(vector_ids, 0, len(vector_ids)), self._paths_for_ids(vector_ids)
+
+    def iter_embeddings(self, block_size: int = 65536) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Stream (ids, vectors, paths) in blocks of at most `block_size` rows."""
+        vector_ids = self._vector_ids()
+        for start in range(0, len(vector_ids), block_size):
+            stop = min(start + block_size, len(vector_ids))
+            block_ids = vector_ids[start:stop]
+            yield block_ids, self._vectors_at(vector_ids, start, stop), self._paths_for_ids(block_ids)
+
+    def dump_embeddings(self, npy_path: str, block_size: int = 65536) -> np.ndarray:
+        """Write all vectors to an .npy file block by block and return the matching paths.
+
+        The file can be reopened with np.load(npy_path, mmap_mode='r').
+        """
+        return dump_blocks(npy_path, self.iter_embeddings(block_size), len(self), self.dimension)
+
+    def _vector_ids(self) -> np.ndarray:
+        """Ids of every stored vector, in the order the index stores them."""
+        id_map_index = self._id_map_index()
+        if id_map_index is not None:
+            return faiss.vector_to_array(id_map_index.id_map)
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            invlists = ivf.invlists
+            lists = [
+                faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+                for list_no in range(ivf.nlist) if invlists.list_size(list_no)
+            ]
+            return np.concatenate(lists) if lists else np.empty(0, dtype=np.int64)
+        return np.arange(self.index.ntotal, dtype=np.int64)
+
+    def _vectors_at(self, vector_ids: np.ndarray, start: int, stop: int) -> np.ndarray:
+        if faiss.try_extract_index_ivf(self.index) is not None and self._id_map_index() is None:
+            # IVF list order is not insertion order, so go through the id hashtable.
+            return self.index.reconstruct_batch(vector_ids[start:stop])
+        id_map_index = self._id_map_index()
+        storage = faiss.downcast_index(id_map_index.index) if id_map_index is not None else faiss.downcast_index(self.index)
+        if isinstance(storage, faiss.IndexFlat):
+            buffer = faiss.rev_swig_ptr(storage.get_xb(), storage.ntotal * self.dimension)
+            return buffer.reshape(storage.ntotal, self.dimension)[start:stop]
+        return storage.reconstruct_n(start, stop - start)
+
+    def _paths_for_ids(self, vector_ids: np.ndarray) -> np.ndarray:
+        lookup = self.metadata.get_paths(vector_ids.tolist())
+        return np.array([lookup.get(vector_id) for vector_id in vector_ids.tolist()], dtype=object)
+
+    def close(self):
+        self.flush()
+        if self._vectors_file is not None:
+            self._vectors_file.close()
+            self._vectors_file = None
+        self._vectors_view = None
+        self.metadata.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def __len__(self):
         return self.index.ntotal
+
+class ShardedSearchResults(SearchResults):
+    """SearchResults over global ids (local_id * n_shards + shard), resolved shard by shard."""
+
+    def __init__(self, ids: np.ndarray, distances: np.ndarray, shards: List[FAISSStorage]):
+        super().__init__(ids, distances, None)
+        self._shards = shards
+
+    def locations(self) -> Dict[int, Tuple[str, int, int]]:
+        if self._locations is None:
+            found = self.ids[self.ids != -1]
+            n_shards = len(self._shards)
+            self._locations = {}
+            for shard_no, shard in enumerate(self._shards):
+                local_ids = found[found % n_shards == shard_no] // n_shards
+                if len(local_ids):
+                    self._locations.update(
+                        (local_id * n_shards + shard_no, location)
+                        for local_id, location in shard.metadata.get_locations(local_ids.tolist()).items()
+                    )
+        return self._locations
+
+class ShardedFAISSStorage:
+    """N independent FAISSStorage shards, files routed by a stable hash of their path.
+
+    Shard i lives at `<stem>.shard<i><ext>` with its own metadata sidecar. Searches fan
+    out to every shard on a thread pool (FAISS releases the GIL while searching) and the
+    per-shard top-k lists are merged with a heap. The shard count is fixed when the store
+    is created, since it determines where each path lives.
+    """
+
+    def __init__(self, index_path: str, dimension: int, shards: int, **storage_kwargs):
+        stem, ext = os.path.splitext(index_path)
+        existing = existing_shards(index_path)
+        if existing and existing != shards:
+            raise ValueError(f"{index_path} has {existing} shards; the shard count cannot change")
+        if os.path.exists(index_path):
+            raise ValueError(f"{index_path} is an unsharded store and cannot be opened with {shards} shards")
+        self.index_path = index_path
+        self.dimension = dimension
+        self.shards = [FAISSStorage(f"{stem}.shard{shard_no}{ext}", dimension, **storage_kwargs)
+                       for shard_no in range(shards)]
+        self.index_factory = self.shards[0].index_factory
+        self._pool = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="faiss-shard")
+
+    def shard_for(self, file_path: str) -> int:
+        # crc32 rather than hash(), which is salted per process.
+        return zlib.crc32(file_path.encode('utf-8')) % len(self.shards)
+
+    def _group_by_shard(self, file_paths: Sequence[str]) -> Dict[int, List[int]]:
+        groups: Dict[int, List[int]] = {}
+        for row, file_path in enumerate(file_paths):
+            groups.setdefault(self.shard_for(file_path), []).append(row)
+        return groups
+
+    @property
+    def is_trained(self) -> bool:
+        return all(shard.is_trained for shard in self.shards)
+
+    def train(self, sample: Union[np.ndarray, Sequence[List[float]]]):
+        for shard in self.shards:
+            shard.train(sample)
+
+    def set_search_params(self, **params):
+        for shard in self.shards:
+            shard.set_search_params(**params)
+
+    def store_embedding(self, file_path: str, embedding: List[float]):
+        self.store_embeddings([file_path], [embedding])
+
+    def store_embeddings(self, file_paths: Sequence[str], embeddings: Union[np.ndarray, Sequence[List[float]]],
+                         locations: Optional[Sequence[Tuple[int, int]]] = None):
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        if matrix.shape[0] != len(file_paths):
+            raise ValueError(f"Got {len(file_paths)} paths for {matrix.shape[0]} embeddings")
+        for shard_no, rows in self._group_by_shard(file_paths).items():
+            self.shards[shard_no].store_embeddings(
+                [file_paths[row] for row in rows],
+                matrix[rows],
+                [locations[row] for row in rows] if locations is not None else None
+            )
+
+    def remove_paths(self, file_paths: Sequence[str]) -> int:
+        return sum(
+            self.shards[shard_no].remove_paths([file_paths[row] for row in rows])
+            for shard_no, rows in self._group_by_shard(file_paths).items()
+        )
+
+    def get_file_records(self) -> Dict[str, FileRecord]:
+        records = {}
+        for shard in self.shards:
+            records.update(shard.get_file_records())
+        return records
+
+    def record_files(self, records: Sequence[FileRecord]):
+        for shard_no, rows in self._group_by_shard([record.path for record in records]).items():
+            self.shards[shard_no].record_files([records[row] for row in rows])
+
+    def forget_files(self, file_paths: Sequence[str]):
+        for shard_no, rows in self._group_by_shard(file_paths).items():
+            self.shards[shard_no].forget_files([file_paths[row] for row in rows])
+
+    def flush(self):
+        for shard in self.shards:
+            shard.flush()
+
+    def search_many(self, queries: Union[np.ndarray, Sequence[List[float]]], k: int = 5,
+                    rerank_factor: Optional[int] = None, filters: Optional[Dict[str, Any]] = None) -> SearchResults:
+        queries_np = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        shard_results = list(self._pool.map(lambda shard: shard.search_many(queries_np, k, rerank_factor, filters),
+                                            self.shards))
+        n_shards = len(self.shards)
+        inner_product = self.shards[0].index.metric_type == faiss.METRIC_INNER_PRODUCT
+        sign = -1 if inner_product else 1
+
+        ids = np.full((len(queries_np), k), -1, dtype=np.int64)
+        distances = np.full((len(queries_np), k), -np.inf if inner_product else np.inf, dtype=np.float32)
+        for row in range(len(queries_np)):
+            # Each shard's row is already sorted best-first, so a k-way heap merge suffices.
+            candidates = [
+                [(sign * float(dist), int(idx) * n_shards + shard_no)
+                 for idx, dist in zip(results.ids[row], results.distances[row]) if idx != -1]
+                for shard_no, results in enumerate(shard_results)
+            ]
+            for col, (key, global_id) in enumerate(itertools.islice(heapq.merge(*candidates), k)):
+                ids[row, col] = global_id
+                distances[row, col] = sign * key
+        return ShardedSearchResults(ids, distances, self.shards)
+
+    def search_similar(self, query_embedding: List[float], k: int = 5,
+                       filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self.search_many([query_embedding], k, filters=filters).results(0)
+
+    def export_embeddings(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return every shard's vectors as one (ntotal, dimension) float32 matrix plus a path array."""
+        blocks = list(self.iter_embeddings())
+        if not blocks:
+            return np.empty((0, self.dimension), dtype=np.float32), np.empty(0, dtype=object)
+        return (np.concatenate([vectors for _, vectors, _ in blocks]),
+                np.concatenate([paths for _, _, paths in blocks]))
+
+    def iter_embeddings(self, block_size: int = 65536) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Stream (global ids, vectors, paths) shard by shard."""
+        for shard_no, shard in enumerate(self.shards):
+            for block_ids, vectors, paths in shard.iter_embeddings(block_size):
+                yield block_ids * len(self.shards) + shard_no, vectors, paths
+
+    def dump_embeddings(self, npy_path: str, block_size: int = 65536) -> np.ndarray:
+        """Write all shards' vectors to an .npy file block by block and return the matching paths."""
+        return dump_blocks(npy_path, self.iter_embeddings(block_size), len(self), self.dimension)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+def dump_blocks(npy_path: str, blocks: Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray]], rows: int,
+                dimension: int) -> np.ndarray:
+    """Write (ids, vectors, paths) blocks holding `rows` vectors in total to an .npy file; returns the paths."""
+    out = np.lib.format.open_memmap(npy_path, mode='w+', dtype=np.float32, shape=(rows, dimension))
+    paths = np.empty(rows, dtype=object)
+    row = 0
+    for block_ids, vectors, block_paths in blocks:
+        out[row:row + len(block_ids)] = vectors
+        paths[row:row + len(block_ids)] = block_paths
+        row += len(block_ids)
+    out.flush()
+    del out
+    return paths
+
+def existing_shards(index_path: str) -> int:
+    """The shard count of an existing sharded store at `index_path`, or 0 if there is none."""
+    stem, ext = os.path.splitext(index_path)
+    pattern = re.compile(re.escape(os.path.basename(stem)) + r'\.shard(\d+)' + re.escape(ext) + '$')
+    try:
+        names = os.listdir(os.path.dirname(index_path) or '.')
+    except FileNotFoundError:
+        return 0
+    shard_numbers = [int(match.group(1)) for match in map(pattern.match, names) if match]
+    return max(shard_numbers) + 1 if shard_numbers else 0
+
+def open_storage(index_path: str, dimension: int, shards: int = 1, **storage_kwargs):
+    """A single FAISSStorage, or a ShardedFAISSStorage when `shards` > 1.
+
+    Raises ValueError if the store already exists with a different shard count, which
+    would otherwise start an empty store beside it and re-embed everything.
+    """
+    if shards > 1:
+        return ShardedFAISSStorage(index_path, dimension, shards, **storage_kwargs)
+    existing = existing_shards(index_path)
+    if existing:
+        raise ValueError(f"{index_path} has {existing} shards; the shard count cannot change")
+    return FAISSStorage(index_path, dimension, **storage_kwargs)
@@ -0,0 +1,203 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+from embeddings_generator import EmbeddingFactory, EmbeddingProcessor
+from faiss_storage import FAISSStorage
+from ingest_metrics import IngestMetrics
+from tfidf_embeddings import TfidfModel, iter_batches, iter_corpus_texts
+
+
+def make_vocabulary(rng: random.Random, size: int = 5000) -> List[str]:
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def make_text(rng: random.Random, vocabulary: List[str], words: int) -> str:
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(6, 20))
+        sentences.append(' '.join(rng.choice(vocabulary) for _ in range(length)).capitalize() + '.')
+        words -= length
+    return ' '.join(sentences)
+
+
+def write_pdf(file_path: str, pages: List[str], line_width: int = 90):
+    """Write a minimal text-only PDF (Helvetica, one text stream per page) that PyPDF2 can read."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for text in pages:
+        lines = [text[i:i + line_width] for i in range(0, len(text), line_width)]
+        escaped = (line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for line in lines)
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + ' '.join(f"({line}) '" for line in escaped) + " ET"
+        stream_bytes = stream.encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream_bytes), stream_bytes))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b' '.join(page_refs), len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(file_path, 'wb') as file:
+        file.write(out)
+
+
+def synthesize_corpus(corpus_dir: str, size: int, file_format: str, seed: int = 0) -> str:
+    """Create `size` documents once; later runs with the same arguments reuse them."""
+    marker = f"{corpus_dir}.complete"
+    if os.path.exists(marker):
+        return corpus_dir
+    shutil.rmtree(corpus_dir, ignore_errors=True)
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    for doc_id in range(size):
+        # Spread files over subdirectories to keep directory listings reasonable.
+        directory = os.path.join(corpus_dir, f"{doc_id // 1000:04d}")
+        os.makedirs(directory, exist_ok=True)
+        if file_format == 'pdf':
+            pages = [make_text(rng, vocabulary, rng.randint(150, 400)) for _ in range(rng.randint(1, 3))]
+            write_pdf(os.path.join(directory, f"doc{doc_id}.pdf"), pages)
+        else:
+            with open(os.path.join(directory, f"doc{doc_id}.txt"), 'w', encoding='utf-8') as file:
+                file.write(make_text(rng, vocabulary, rng.randint(150, 600)))
+    open(marker, 'w').close()
+    return corpus_dir
+
+
+def bytes_written() -> int:
+    # Linux only; counts bytes this process actually sent to the storage layer.
+    try:
+        with open('/proc/self/io') as io_file:
+            for line in io_file:
+                if line.startswith('write_bytes:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return -1
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(path) for file in files)
+
+
+def run_one(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Ingest one corpus with one configuration. Runs in its own process so peak RSS is per run."""
+    logging.getLogger().setLevel(logging.WARNING)
+    shutil.rmtree(run['index_dir'], ignore_errors=True)
+    index_path = os.path.join(run['index_dir'], 'index.idx')
+    model_path = f"{run['corpus_dir']}.tfidf{run['dimension']}.pkl"
+    if not os.path.exists(model_path):
+        texts = iter_corpus_texts({"input_paths": [run['corpus_dir']]})
+        TfidfModel.fit_streaming(iter_batches(texts), run['dimension']).save(model_path)
+
+    metrics = IngestMetrics()
+    generator = EmbeddingFactory.create_embedding_generator({
+        "module": "tfidf_embeddings",
+        "batch_function": "generate_tfidf_embeddings",
+        "batch_size": run['batch_size'],
+        "params": {"max_features": run['dimension'], "model_path": model_path}
+    })
+
+    io_before = bytes_written()
+    start = time.perf_counter()
+    with FAISSStorage(index_path, run['dimension'], flush_every=run['flush_every'],
+                      index_factory=run['index_factory'], metrics=metrics) as storage:
+        processor = EmbeddingProcessor(generator, storage, workers=run['workers'], batch_size=run['batch_size'],
+                                       chunk_strategy=run['chunk_strategy'], metrics=metrics)
+        if not storage.is_trained:
+            with metrics.time('train'):
+                processor.train_on_sample([run['corpus_dir']], run['train_size'])
+        processor.process_inputs([run['corpus_dir']])
+        vectors = len(storage)
+    elapsed = time.perf_counter() - start
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        **{name: run[name] for name in ('size', 'format', 'index_factory', 'batch_size', 'workers', 'chunk_strategy')},
+        "documents": run['size'],
+        "vectors": vectors,
+        "seconds": elapsed,
+        "docs_per_sec": run['size'] / elapsed if elapsed else 0.0,
+        "bytes_written": bytes_written() - io_before if io_before >= 0 else None,
+        "index_bytes": directory_size(run['index_dir']),
+        # ru_maxrss is KiB on Linux.
+        "peak_rss_mb": self_usage.ru_maxrss / 1024,
+        "peak_worker_rss_mb": child_usage.ru_maxrss / 1024,
+        # Extraction seconds are summed over workers, so they can exceed wall-clock time.
+        "stage_seconds": metrics.stage_seconds(),
+        "max_store_queue_depth": metrics.max_gauges.get('store_queue_depth')
+    }
+
+
+def main(args):
+    results = []
+    for size, file_format in itertools.product(args.sizes, args.formats):
+        corpus_dir = synthesize_corpus(os.path.join(args.work_dir, f"corpus_{file_format}_{size}"), size, file_format, args.seed)
+        for index_factory, batch_size, workers in itertools.product(args.index_factories, args.batch_sizes, args.workers):
+            run = {
+                "size": size,
+                "format": file_format,
+                "corpus_dir": corpus_dir,
+                "index_dir": os.path.join(args.work_dir, "index"),
+                "index_factory": index_factory,
+                "batch_size": batch_size,
+                "workers": workers,
+                "dimension": args.dimension,
+                "flush_every": args.flush_every,
+                "train_size": args.train_size,
+                "chunk_strategy": args.chunk_strategy
+            }
+            completed = subprocess.run([sys.executable, __file__, "--run-one", json.dumps(run)],
+                                       capture_output=True, text=True, check=True)
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(f"{size:>7} {file_format:<4} {index_factory:<16} batch={batch_size:<5} workers={workers:<3} "
+                  f"{result['docs_per_sec']:10.1f} docs/s  {result['peak_rss_mb']:8.1f} MB", file=sys.stderr)
+            results.append(result)
+
+    report = json.dumps({"seed": args.seed, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark EmbeddingProcessor ingest throughput on synthetic corpora.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Corpus sizes in documents")
+    parser.add_argument("--formats", nargs="+", choices=["txt", "pdf"], default=["txt", "pdf"], help="Document formats")
+    parser.add_argument("--index-factories", nargs="+", default=["Flat", "IVF256,Flat", "HNSW32"], help="FAISS index factory strings")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 256], help="Embedding batch sizes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="Extraction worker counts")
+    parser.add_argument("--chunk-strategy", default="file", help="Chunking strategy for every run")
+    parser.add_argument("--dimension", type=int, default=256, help="Embedding dimension (hashed TF-IDF features)")
+    parser.add_argument("--flush-every", type=int, default=1000, help="Vectors buffered between index writes")
+    parser.add_argument("--train-size", type=int, default=10000, help="Chunks used to train IVF/PQ indexes")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for corpus synthesis")
+    parser.add_argument("--work-dir", default="benchmark_work", help="Where corpora and indexes are written")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(json.loads(args.run_one))))
+    else:
+        main(args)
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; per-batch stages land in the middle, per-file extraction at the low end.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        total = 0
+        cumulative = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class IngestMetrics:
+    """Counters, per-stage timing histograms, failures by exception type and queue depths.
+
+    Snapshots go to every configured sink on `emit()`, and at most every
+    `emit_interval` seconds through `maybe_emit()`.
+    """
+
+    def __init__(self, sinks: Optional[List] = None, emit_interval: float = 30.0):
+        self.sinks = sinks or []
+        self.emit_interval = emit_interval
+        self.counters: Counter = Counter()
+        self.failures: Counter = Counter()
+        self.histograms: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, float] = {}
+        self.max_gauges: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._last_emit = time.monotonic()
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self.histograms.setdefault(stage, Histogram()).observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def record_failure(self, stage: str, error: BaseException):
+        with self._lock:
+            self.failures[(stage, type(error).__name__)] += 1
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+            self.max_gauges[name] = max(value, self.max_gauges.get(name, value))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "uptime_seconds": time.time() - self._started,
+                "counters": dict(self.counters),
+                "failures": [
+                    {"stage": stage, "exception": exception, "count": count}
+                    for (stage, exception), count in self.failures.items()
+                ],
+                "stages": {
+                    stage: {"count": histogram.count, "sum": histogram.sum,
+                            "buckets": {str(bound): count for bound, count in histogram.cumulative()}}
+                    for stage, histogram in self.histograms.items()
+                },
+                "gauges": dict(self.gauges),
+                "max_gauges": dict(self.max_gauges)
+            }
+
+    def stage_seconds(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: histogram.sum for stage, histogram in self.histograms.items()}
+
+    def maybe_emit(self):
+        if self.sinks and time.monotonic() - self._last_emit >= self.emit_interval:
+            self.emit()
+
+    def emit(self):
+        self._last_emit = time.monotonic()
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.write(snapshot)
+
+
+class JsonLinesSink:
+    """Appends one JSON snapshot per emit."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, snapshot: Dict):
+        with open(self.path, 'a', encoding='utf-8') as sink_file:
+            sink_file.write(json.dumps(snapshot) + '\n')
+
+
+class PrometheusTextFileSink:
+    """Rewrites a Prometheus text-format file, e.g. for node_exporter's textfile collector."""
+
+    def __init__(self, path: str, prefix: str = "embeddings_ingest"):
+        self.path = path
+        self.prefix = prefix
+
+    def write(self, snapshot: Dict):
+        p = self.prefix
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines += [f"# TYPE {p}_{name}_total counter", f"{p}_{name}_total {value}"]
+        if snapshot['failures']:
+            lines.append(f"# TYPE {p}_failures_total counter")
+            for failure in snapshot['failures']:
+                lines.append(f'{p}_failures_total{{stage="{failure["stage"]}",exception="{failure["exception"]}"}} {failure["count"]}')
+        if snapshot['stages']:
+            lines.append(f"# TYPE {p}_stage_seconds histogram")
+            for stage, histogram in sorted(snapshot['stages'].items()):
+                for bound, count in histogram['buckets'].items():
+                    lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines += [f"# TYPE {p}_{name} gauge", f"{p}_{name} {value}",
+                      f"# TYPE {p}_{name}_max gauge", f"{p}_{name}_max {snapshot['max_gauges'][name]}"]
+
+        # Scrapers must never see a half-written file.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as sink_file:
+            sink_file.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.path)
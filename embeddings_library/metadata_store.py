@@ -0,0 +1,211 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+FILTER_KEYS = ("source_dir", "file_type", "modified_after", "modified_before")
+
+class FileRecord(NamedTuple):
+    path: str
+    content_hash: str
+    mtime: float
+    size: int
+
+def file_attributes(path: str) -> Tuple[str, str, Optional[float]]:
+    """(source_dir, file_type, mtime) recorded with every vector of `path`, for filtering."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    return os.path.dirname(os.path.normpath(path)), os.path.splitext(path)[1].lstrip('.').lower(), mtime
+
+class MetadataStore:
+    """SQLite sidecar holding per-vector metadata for a FAISS index.
+
+    The connection is opened on first use, so loading a large store does not
+    pay for reading the mapping until a lookup actually needs it.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Writes may come from an ingest writer thread; callers serialize access.
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._create_tables()
+        return self._conn
+
+    def _create_tables(self):
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS vectors (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                page INTEGER NOT NULL DEFAULT 1,
+                chunk_offset INTEGER NOT NULL DEFAULT 0,
+                source_dir TEXT,
+                file_type TEXT,
+                mtime REAL
+            )
+        ''')
+        added = self._add_missing_columns('vectors', {
+            'page': 'INTEGER NOT NULL DEFAULT 1',
+            'chunk_offset': 'INTEGER NOT NULL DEFAULT 0',
+            'source_dir': 'TEXT',
+            'file_type': 'TEXT',
+            'mtime': 'REAL'
+        })
+        if 'source_dir' in added:
+            self._backfill_file_attributes()
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_vectors_path ON vectors (path)')
+        # Secondary indexes for filtered search.
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_vectors_source_dir ON vectors (source_dir)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_vectors_file_type ON vectors (file_type)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_vectors_mtime ON vectors (mtime)')
+        # Manifest of ingested files, used to skip unchanged files on re-runs.
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        ''')
+        # Ids that have a row in the full-precision vector file, as [start, stop) ranges.
+        # Re-ranking can be switched on and off between runs, so the file may have gaps.
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS full_precision_rows (
+                start INTEGER PRIMARY KEY,
+                stop INTEGER NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def _add_missing_columns(self, table: str, columns: Dict[str, str]) -> List[str]:
+        # Sidecars written by older versions lack newer columns.
+        existing = {row[1] for row in self._conn.execute(f'PRAGMA table_info({table})')}
+        added = []
+        for name, definition in columns.items():
+            if name not in existing:
+                self._conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+                added.append(name)
+        return added
+
+    def _backfill_file_attributes(self):
+        paths = [row[0] for row in self._conn.execute('SELECT DISTINCT path FROM vectors')]
+        self._conn.executemany(
+            'UPDATE vectors SET source_dir = ?, file_type = ?, mtime = ? WHERE path = ?',
+            (file_attributes(path) + (path,) for path in paths)
+        )
+
+    def add_vectors(self, rows: Iterable[Tuple[int, str, int, int]]):
+        # (id, path, page, chunk_offset); left uncommitted until the owning storage flushes its index.
+        attributes: Dict[str, Tuple[str, str, Optional[float]]] = {}
+        def with_attributes(row):
+            if row[1] not in attributes:
+                attributes[row[1]] = file_attributes(row[1])
+            return tuple(row) + attributes[row[1]]
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO vectors (id, path, page, chunk_offset, source_dir, file_type, mtime) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (with_attributes(row) for row in rows)
+        )
+
+    def get_path(self, vector_id: int) -> Optional[str]:
+        row = self.conn.execute('SELECT path FROM vectors WHERE id = ?', (int(vector_id),)).fetchone()
+        return row[0] if row else None
+
+    def get_paths(self, vector_ids: Sequence[int]) -> Dict[int, str]:
+        ids = list({int(vector_id) for vector_id in vector_ids})
+        paths = {}
+        for batch in self._batches(ids):
+            placeholders = ', '.join('?' * len(batch))
+            query = f'SELECT id, path FROM vectors WHERE id IN ({placeholders})'
+            paths.update(self.conn.execute(query, batch).fetchall())
+        return paths
+
+    def get_locations(self, vector_ids: Sequence[int]) -> Dict[int, Tuple[str, int, int]]:
+        ids = list({int(vector_id) for vector_id in vector_ids})
+        locations = {}
+        for batch in self._batches(ids):
+            placeholders = ', '.join('?' * len(batch))
+            query = f'SELECT id, path, page, chunk_offset FROM vectors WHERE id IN ({placeholders})'
+            locations.update((row[0], row[1:]) for row in self.conn.execute(query, batch))
+        return locations
+
+    def get_ids_for_paths(self, paths: Sequence[str]) -> List[int]:
+        ids = []
+        for batch in self._batches(list(paths)):
+            placeholders = ', '.join('?' * len(batch))
+            query = f'SELECT id FROM vectors WHERE path IN ({placeholders})'
+            ids.extend(row[0] for row in self.conn.execute(query, batch))
+        return ids
+
+    def delete_ids(self, vector_ids: Sequence[int]):
+        self.conn.executemany('DELETE FROM vectors WHERE id = ?', ((int(vector_id),) for vector_id in vector_ids))
+
+    def find_ids(self, source_dir: Optional[str] = None, file_type: Optional[Union[str, Sequence[str]]] = None,
+                 modified_after: Optional[float] = None, modified_before: Optional[float] = None) -> List[int]:
+        """Ids of vectors matching every given filter.
+
+        `source_dir` matches the directory and everything below it; `file_type` is an
+        extension ("pdf") or a list of them; the modified bounds are Unix timestamps.
+        """
+        clauses, params = [], []
+        if source_dir is not None:
+            source_dir = os.path.normpath(source_dir)
+            prefix = source_dir.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("(source_dir = ? OR source_dir LIKE ? ESCAPE '\\')")
+            params += [source_dir, prefix + os.sep + '%']
+        if file_type is not None:
+            file_types = [file_type] if isinstance(file_type, str) else list(file_type)
+            clauses.append(f"file_type IN ({', '.join('?' * len(file_types))})")
+            params += [file_type.lstrip('.').lower() for file_type in file_types]
+        if modified_after is not None:
+            clauses.append('mtime >= ?')
+            params.append(modified_after)
+        if modified_before is not None:
+            clauses.append('mtime < ?')
+            params.append(modified_before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return [row[0] for row in self.conn.execute(f'SELECT id FROM vectors {where}', params)]
+
+    def add_full_precision_rows(self, start: int, stop: int):
+        # Extends the range that ends at `start`, if any; left uncommitted like add_vectors.
+        if not self.conn.execute('UPDATE full_precision_rows SET stop = ? WHERE stop = ?', (stop, start)).rowcount:
+            self.conn.execute('INSERT INTO full_precision_rows (start, stop) VALUES (?, ?)', (start, stop))
+
+    def get_full_precision_rows(self) -> List[Tuple[int, int]]:
+        return self.conn.execute('SELECT start, stop FROM full_precision_rows ORDER BY start').fetchall()
+
+    def max_id(self) -> Optional[int]:
+        return self.conn.execute('SELECT MAX(id) FROM vectors').fetchone()[0]
+
+    def get_file_records(self) -> Dict[str, FileRecord]:
+        rows = self.conn.execute('SELECT path, content_hash, mtime, size FROM files')
+        return {row[0]: FileRecord(*row) for row in rows}
+
+    def record_files(self, records: Iterable[FileRecord]):
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO files (path, content_hash, mtime, size) VALUES (?, ?, ?, ?)', records
+        )
+
+    def delete_files(self, paths: Sequence[str]):
+        self.conn.executemany('DELETE FROM files WHERE path = ?', ((path,) for path in paths))
+
+    @staticmethod
+    def _batches(values: list, size: int = 500) -> Iterable[list]:
+        # Stay well under SQLite's bound-parameter limit.
+        for start in range(0, len(values), size):
+            yield values[start:start + size]
+
+    def commit(self):
+        if self._conn is not None:
+            self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
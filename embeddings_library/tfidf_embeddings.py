@@ -1,8 +1,137 @@
 # tfidf_embeddings.py
-from sklearn.feature_extraction.text import TfidfVectorizer
+import argparse
+import os
+import pickle
+from typing import Dict, Iterable, List, Optional
+
 import numpy as np
+import scipy.sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+
+class TfidfModel:
+    """A TF-IDF model fitted once on a corpus, so every document shares one feature space.
+
+    Either wraps a fitted TfidfVectorizer, or a HashingVectorizer plus IDF weights
+    accumulated in a single streaming pass. Output is always padded to `dimension`.
+    """
+
+    def __init__(self, dimension: int, vectorizer: Optional[TfidfVectorizer] = None,
+                 hasher: Optional[HashingVectorizer] = None, idf: Optional[np.ndarray] = None):
+        self.dimension = dimension
+        self.vectorizer = vectorizer
+        self.hasher = hasher
+        self.idf = idf
+
+    @classmethod
+    def fit(cls, texts: Iterable[str], max_features: int = 100) -> 'TfidfModel':
+        vectorizer = TfidfVectorizer(max_features=max_features)
+        vectorizer.fit(texts)
+        return cls(max_features, vectorizer=vectorizer)
+
+    @classmethod
+    def fit_streaming(cls, text_batches: Iterable[List[str]], n_features: int = 100) -> 'TfidfModel':
+        # Only document frequencies are kept, so memory does not grow with the corpus.
+        hasher = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        document_frequency = np.zeros(n_features, dtype=np.int64)
+        n_documents = 0
+        for texts in text_batches:
+            counts = hasher.transform(texts)
+            document_frequency += np.bincount(counts.indices, minlength=n_features)
+            n_documents += counts.shape[0]
+        # Same smoothed IDF as TfidfVectorizer's default.
+        idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+        return cls(n_features, hasher=hasher, idf=idf)
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        if self.vectorizer is not None:
+            matrix = self.vectorizer.transform(texts)
+        else:
+            matrix = normalize(self.hasher.transform(texts) @ scipy.sparse.diags(self.idf))
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        embeddings[:, :matrix.shape[1]] = matrix.toarray()
+        return embeddings
+
+    def save(self, model_path: str):
+        os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+        with open(model_path, 'wb') as model_file:
+            pickle.dump(self, model_file)
+
+    @staticmethod
+    def load(model_path: str) -> 'TfidfModel':
+        with open(model_path, 'rb') as model_file:
+            return pickle.load(model_file)
+
 
-def generate_tfidf_embedding(text, max_features=100):
+_models: Dict[str, TfidfModel] = {}
+
+def load_model(model_path: str) -> TfidfModel:
+    # Loaded once per process and reused for every document.
+    if model_path not in _models:
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"TF-IDF model {model_path} not found; fit it with: python tfidf_embeddings.py <config>")
+        _models[model_path] = TfidfModel.load(model_path)
+    return _models[model_path]
+
+def generate_tfidf_embeddings(texts: List[str], max_features=100, model_path=None) -> np.ndarray:
+    if model_path:
+        return load_model(model_path).transform(texts)
+    return np.array([generate_tfidf_embedding(text, max_features) for text in texts], dtype=np.float32)
+
+def generate_tfidf_embedding(text, max_features=100, model_path=None):
+    if model_path:
+        return load_model(model_path).transform([text])[0].tolist()
+    # Without a fitted model each document gets its own vocabulary, so vectors from
+    # different documents are not comparable.
     vectorizer = TfidfVectorizer(max_features=max_features)
-    tfidf_matrix = vectorizer.fit_transform([text])
-    return tfidf_matrix.toarray()[0].tolist()
+    vectorizer.fit([text])
+    return TfidfModel(max_features, vectorizer=vectorizer).transform([text])[0].tolist()
+
+
+def iter_corpus_texts(config: dict) -> Iterable[str]:
+    from chunking import chunk_document
+    chunking = config.get('chunking', {})
+    for input_path in config['input_paths']:
+        file_paths = [input_path] if os.path.isfile(input_path) else (
+            os.path.join(root, file) for root, _, files in os.walk(input_path) for file in files
+        )
+        for file_path in file_paths:
+            for chunk in chunk_document(file_path, chunking.get('strategy', 'file'),
+                                        chunking.get('size', 256), chunking.get('overlap', 32)):
+                yield chunk.text
+
+def iter_batches(texts: Iterable[str], batch_size: int = 1000) -> Iterable[List[str]]:
+    batch = []
+    for text in texts:
+        batch.append(text)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+if __name__ == "__main__":
+    import yaml
+    # Pickle the model under its importable name rather than __main__.
+    from tfidf_embeddings import TfidfModel
+
+    parser = argparse.ArgumentParser(description="Fit a corpus-level TF-IDF model for the documents in a YAML configuration.")
+    parser.add_argument("config", help="Path to the YAML configuration file")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Use a HashingVectorizer and accumulate IDF in one pass instead of holding a vocabulary")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as config_file:
+        config = yaml.safe_load(config_file)
+    params = config['embedding'].get('params', {})
+    model_path = params['model_path']
+    dimension = params.get('max_features', config['embedding_dimension'])
+
+    if args.streaming:
+        model = TfidfModel.fit_streaming(iter_batches(iter_corpus_texts(config)), dimension)
+    else:
+        model = TfidfModel.fit(iter_corpus_texts(config), dimension)
+    model.save(model_path)
+    print(f"Saved TF-IDF model ({dimension} features) to {model_path}")
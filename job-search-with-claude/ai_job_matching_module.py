@@ -1,65 +1,247 @@
+import itertools
+import os
 import spacy
-from typing import List, Dict, Tuple
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 from data_management_module import DataManager
+from skill_matrix import SkillMatrix
+from job_vectors import JobVectorIndex, create_embedder
 import logging
-from collections import Counter
+from datetime import date, timedelta
+
+# Skill extraction needs entities (ner) and noun chunks, which need the dependency parse
+# and coarse POS tags (tagger + attribute_ruler); everything else is skipped.
+SKILL_PIPES = ("tok2vec", "tagger", "attribute_ruler", "parser", "ner")
 
 class AIJobMatcher:
-    def __init__(self, db_name: str = 'job_search.db'):
+    def __init__(self, db_name: str = 'job_search.db', data_manager: Optional[DataManager] = None,
+                 nlp_batch_size: int = 256, nlp_processes: int = 1, embedder: Optional[str] = None,
+                 embedding_model: str = 'all-MiniLM-L6-v2', tfidf_features: int = 512, rerank_factor: int = 4):
         self.nlp = spacy.load("en_core_web_sm")
-        self.data_manager = DataManager(db_name)
+        self.data_manager = data_manager or DataManager(db_name)
         self.logger = logging.getLogger(__name__)
+        self.nlp_batch_size = nlp_batch_size
+        self.nlp_processes = nlp_processes
+        self._unused_pipes = [name for name in self.nlp.pipe_names if name not in SKILL_PIPES]
+        self._skill_matrix: Optional[SkillMatrix] = None
+        self._skill_matrix_version: Optional[Tuple[int, int]] = None
+        # Semantic matching: jobs embedded at ingest, ranked by nearest-neighbour search.
+        self.embedder = create_embedder(embedder, embedding_model, tfidf_features, self._sidecar_path('tfidf.pkl'))
+        self.rerank_factor = rerank_factor
+        self._job_vectors: Optional[JobVectorIndex] = None
 
     def preprocess_text(self, text: str) -> List[str]:
         doc = self.nlp(text.lower())
         return [token.lemma_ for token in doc if not token.is_stop and not token.is_punct and token.is_alpha]
 
     def extract_skills(self, text: str) -> List[str]:
-        doc = self.nlp(text)
+        with self.nlp.select_pipes(disable=self._unused_pipes):
+            return self._skills_from_doc(self.nlp(text))
+
+    def extract_skills_bulk(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        """Skills for each text, in order, parsed in batches (across processes if `nlp_processes` > 1).
+
+        Lazy: results stream out as batches finish, so callers can store them as they go.
+        """
+        docs = self.nlp.pipe(texts, batch_size=self.nlp_batch_size, n_process=self.nlp_processes,
+                             disable=self._unused_pipes)
+        for doc in docs:
+            yield self._skills_from_doc(doc)
+
+    @staticmethod
+    def _skills_from_doc(doc) -> List[str]:
         skills = [ent.text.lower() for ent in doc.ents if ent.label_ == "SKILL"]
         skills.extend([chunk.text.lower() for chunk in doc.noun_chunks if chunk.root.pos_ == "NOUN"])
         return list(set(skills))
 
+    @property
+    def model_version(self) -> str:
+        # Stored job skills are tied to the model that extracted them.
+        meta = self.nlp.meta
+        return f"{meta['lang']}_{meta['name']}=={meta['version']}"
+
+    @staticmethod
+    def job_text(job: Dict) -> str:
+        return f"{job['title'] or ''} {job['description'] or ''}"
+
+    @staticmethod
+    def profile_text(profile: Dict) -> str:
+        return profile['skills'] + " " + profile['experience'] + " " + profile['resume_text']
+
+    def _sidecar_path(self, suffix: str) -> Optional[str]:
+        # Derived data kept in files next to the database; none for in-memory databases.
+        db_name = self.data_manager.pool.db_name
+        return None if db_name == ':memory:' else f"{os.path.splitext(db_name)[0]}.{suffix}"
+
+    def index_jobs(self) -> int:
+        """Extract skills for, and embed, every job not yet indexed. Returns the number of jobs given skills."""
+        indexed = self.index_job_skills()
+        self.index_job_vectors()
+        return indexed
+
+    def index_job_skills(self, jobs: Optional[List[Dict]] = None, batch_size: int = 500) -> int:
+        """Extract and store skills for `jobs`, or for every job not yet indexed with this model.
+
+        Called at ingest, so ranking only looks skills up. Returns the number of jobs indexed.
+        """
+        if jobs is None:
+            jobs = self.data_manager.get_jobs_without_skills(self.model_version)
+        indexed = 0
+        # One pipe over all jobs (worker processes start once); results are stored every `batch_size` jobs.
+        extracted = zip(jobs, self.extract_skills_bulk(self.job_text(job) for job in jobs))
+        while True:
+            job_skills = {job['job_id']: skills for job, skills in itertools.islice(extracted, batch_size)}
+            if not job_skills:
+                break
+            if self.data_manager.set_job_skills(job_skills, self.model_version):
+                indexed += len(job_skills)
+        if indexed:
+            self.logger.info(f"Indexed skills for {indexed} jobs with {self.model_version}")
+        return indexed
+
+    def skill_matrix(self) -> SkillMatrix:
+        """The job x skill matrix for the current skill index.
+
+        Kept in memory and in a file next to the database, and rebuilt only when the
+        skill index version has moved on or the database was recreated.
+        """
+        version = self.data_manager.get_skill_index_version()
+        if self._skill_matrix is not None and version == self._skill_matrix_version:
+            return self._skill_matrix
+        path = self._sidecar_path('skill_matrix.pkl')
+        matrix = SkillMatrix.load(path, version) if path else None
+        if matrix is None:
+            matrix = SkillMatrix.from_job_skills(self.data_manager.get_all_job_skills())
+            if path and version is not None:
+                matrix.save(path, version)
+        self._skill_matrix, self._skill_matrix_version = matrix, version
+        return matrix
+
+    def job_vector_index(self) -> JobVectorIndex:
+        if self._job_vectors is None:
+            index = JobVectorIndex(self._sidecar_path('job_vectors.faiss'), self.embedder.dimension)
+            self._reconcile_job_vectors(index)
+            self._job_vectors = index
+        return self._job_vectors
+
+    def _reconcile_job_vectors(self, index: JobVectorIndex):
+        # On load, drop vectors of deleted jobs and of other models, and re-embed jobs whose
+        # vectors never reached the index file. Later deletions only leave stale vectors,
+        # which searches skip, until the next load.
+        embedded = self.data_manager.get_embedded_jobs(self.embedder.model)
+        stored = set(index.ids().tolist())
+        stale = [vector_id for vector_id in stored if vector_id not in embedded]
+        index.remove(stale)
+        if stale:
+            index.save()
+        self.data_manager.delete_job_vectors(job_id for vector_id, job_id in embedded.items() if vector_id not in stored)
+
+    def index_job_vectors(self, batch_size: int = 1000, refit: bool = False) -> int:
+        """Embed every job not yet embedded with the current model. Returns the number embedded.
+
+        Called at ingest, so ranking only embeds the profile.
+        """
+        if self.embedder is None:
+            return 0
+        if refit or self.embedder.needs_fit(self.data_manager.count_jobs()):
+            texts = [self.job_text(job) for job in self.data_manager.get_all_jobs()]
+            if not texts:
+                return 0
+            try:
+                self.embedder.fit(texts)
+            except ValueError as e:
+                self.logger.warning(f"Cannot fit {self.embedder.model}: {e}")
+                return 0
+            # The vocabulary, and so the dimension, may have changed.
+            self._job_vectors = None
+        model = self.embedder.model
+        index = self.job_vector_index()
+        jobs = self.data_manager.get_jobs_without_vectors(model)
+        if not jobs:
+            return 0
+        for start in range(0, len(jobs), batch_size):
+            batch = jobs[start:start + batch_size]
+            index.add([job['vector_id'] for job in batch], self.embedder.embed([self.job_text(job) for job in batch]))
+        # The index file is written before the jobs are marked, so a crash in between only re-embeds them.
+        index.save()
+        if self.data_manager.set_job_vectors((job['job_id'] for job in jobs), model):
+            self.logger.info(f"Embedded {len(jobs)} jobs with {model}")
+        return len(jobs)
+
+    def rank_jobs_semantic(self, user_id: int, top_n: int = 10,
+                           rerank_factor: Optional[int] = None) -> List[Tuple[Dict, float]]:
+        """Jobs nearest to the user's profile in embedding space, scored by cosine similarity.
+
+        With a `rerank_factor` above 1, that many times `top_n` candidates are fetched and
+        re-ranked by the mean of cosine similarity and skill Jaccard.
+        """
+        if self.embedder is None:
+            self.logger.error("Semantic matching needs an embedder (matching.embedder)")
+            return []
+        user_profile = self.data_manager.get_user_profile(user_id)
+        if not user_profile:
+            self.logger.error(f"User profile not found for user_id: {user_id}")
+            return []
+
+        # Catch up on jobs stored without vectors; a no-op otherwise.
+        self.index_job_vectors()
+        if self._job_vectors is None:
+            return []
+
+        factor = max(self.rerank_factor if rerank_factor is None else rerank_factor, 1)
+        query = self.embedder.embed([self.profile_text(user_profile)])[0]
+        candidates = self.job_vector_index().search(query, top_n * factor)
+        jobs = self.data_manager.get_jobs_by_vector_id([vector_id for vector_id, _ in candidates], self.embedder.model)
+        ranked = [(jobs[vector_id], score) for vector_id, score in candidates if vector_id in jobs]
+        if factor > 1:
+            user_skills = self.extract_skills(self.profile_text(user_profile))
+            self.index_job_skills()
+            ranked = [
+                (job, (score + self.calculate_similarity(user_skills, self.data_manager.get_job_skills(job['job_id']))) / 2)
+                for job, score in ranked
+            ]
+            ranked.sort(key=lambda ranked_job: ranked_job[1], reverse=True)
+        return ranked[:top_n]
+
     def calculate_similarity(self, profile_skills: List[str], job_skills: List[str]) -> float:
         profile_set = set(profile_skills)
         job_set = set(job_skills)
         intersection = profile_set.intersection(job_set)
-        return len(intersection) / (len(profile_set) + len(job_set) - len(intersection))
+        union = len(profile_set) + len(job_set) - len(intersection)
+        return len(intersection) / union if union else 0.0
+
+    def rank_jobs_for_user(self, user_id: int, top_n: int = 10, mode: str = 'skills') -> List[Tuple[Dict, float]]:
+        if mode == 'semantic':
+            return self.rank_jobs_semantic(user_id, top_n)
 
-    def rank_jobs_for_user(self, user_id: int, top_n: int = 10) -> List[Tuple[Dict, float]]:
         user_profile = self.data_manager.get_user_profile(user_id)
         if not user_profile:
             self.logger.error(f"User profile not found for user_id: {user_id}")
             return []
 
-        user_skills = self.extract_skills(user_profile['skills'] + " " + user_profile['experience'] + " " + user_profile['resume_text'])
-        
-        all_jobs = self.data_manager.get_all_jobs()
-        job_rankings = []
+        user_skills = set(self.extract_skills(self.profile_text(user_profile)))
 
-        for job in all_jobs:
-            job_skills = self.extract_skills(job['title'] + " " + job['description'])
-            similarity_score = self.calculate_similarity(user_skills, job_skills)
-            job_rankings.append((job, similarity_score))
+        # Catch up on jobs stored without skills (e.g. before the index existed); a no-op otherwise.
+        self.index_job_skills()
 
-        return sorted(job_rankings, key=lambda x: x[1], reverse=True)[:top_n]
+        # Jaccard against every job in one sparse mat-vec; jobs sharing no skill score 0 and are left out.
+        top_scores = self.skill_matrix().top_n(user_skills, top_n)
+        jobs = self.data_manager.get_jobs([job_id for job_id, _ in top_scores])
+        return [(jobs[job_id], score) for job_id, score in top_scores if job_id in jobs]
 
-    def get_skill_recommendations(self, user_id: int, top_n: int = 5) -> List[str]:
+    def get_skill_recommendations(self, user_id: int, top_n: int = 5, days: Optional[int] = None) -> List[str]:
+        """The skills most in demand across stored jobs (posted in the last `days`, if given) that the user lacks."""
         user_profile = self.data_manager.get_user_profile(user_id)
         if not user_profile:
             self.logger.error(f"User profile not found for user_id: {user_id}")
+            return []
 
-        user_skills = set(self.extract_skills(user_profile['skills'] + " " + user_profile['experience'] + " " + user_profile['resume_text']))
-        
-        all_jobs = self.data_manager.get_all_jobs()
-        job_skills = []
+        user_skills = set(self.extract_skills(self.profile_text(user_profile)))
 
-        for job in all_jobs:
-            job_skills.extend(self.extract_skills(job['title'] + " " + job['description']))
+        # Counts are kept per skill as jobs are indexed; only jobs not yet indexed are parsed here.
+        self.index_job_skills()
 
-        skill_counter = Counter(job_skills)
-        recommended_skills = [skill for skill, _ in skill_counter.most_common() if skill not in user_skills]
-        return recommended_skills[:top_n]
+        since = (date.today() - timedelta(days=days)).isoformat() if days is not None else None
+        return [skill for skill, _ in self.data_manager.get_top_skills(top_n, exclude=user_skills, since=since)]
 
     def update_user_profile_skills(self, user_id: int) -> bool:
         user_profile = self.data_manager.get_user_profile(user_id)
@@ -67,7 +249,7 @@ class AIJobMatcher:
             self.logger.error(f"User profile not found for user_id: {user_id}")
             return False
 
-        extracted_skills = self.extract_skills(user_profile['skills'] + " " + user_profile['experience'] + " " + user_profile['resume_text'])
+        extracted_skills = self.extract_skills(self.profile_text(user_profile))
         updated_skills = ", ".join(extracted_skills)
 
         return self.data_manager.update_user_profile(user_id, {'skills': updated_skills})
@@ -1,16 +1,21 @@
 import requests
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import logging
 from datetime import datetime, timedelta
 import time
 from data_management_module import DataManager
 
 class APIIntegration:
-    def __init__(self, app_id: str, api_key: str, db_name: str = 'job_search.db', base_url: str = "http://api.adzuna.com/v1/api/jobs"):
+    def __init__(self, app_id: str, api_key: str, db_name: str = 'job_search.db', base_url: str = "http://api.adzuna.com/v1/api/jobs",
+                 data_manager: Optional[DataManager] = None,
+                 skill_indexer: Optional[Callable[[], int]] = None):
         self.app_id = app_id
         self.api_key = api_key
         self.base_url = base_url
-        self.data_manager = DataManager(db_name)
+        self.data_manager = data_manager or DataManager(db_name)
+        # e.g. AIJobMatcher.index_jobs, so skills are extracted (and jobs embedded) once when jobs
+        # arrive; it picks up exactly the new and edited jobs, whose stored skills the upsert cleared.
+        self.skill_indexer = skill_indexer
         self.logger = logging.getLogger(__name__)
 
     def fetch_jobs(self, what: str, where: str, days_old: int = 30, page: int = 1, results_per_page: int = 50) -> Optional[List[Dict]]:
@@ -56,17 +61,17 @@ class APIIntegration:
             if not jobs:
                 break
 
-            for job in jobs:
-                processed_job = self.process_job(job)
-                result = self.data_manager.add_job(processed_job)
-                if result:
-                    total_stored += 1
-                    self.logger.info(f"Stored job: {processed_job['title']}")
-                else:
-                    self.logger.info(f"Failed to store job: {processed_job['title']}")
-
-                if total_stored >= max_jobs:
-                    break
+            processed_jobs = [self.process_job(job) for job in jobs[:max_jobs - total_stored]]
+            # One transaction per page rather than one per job.
+            counts = self.data_manager.add_jobs(processed_jobs)
+            if counts is not None:
+                total_stored += len(processed_jobs)
+                if self.skill_indexer is not None and counts['inserted'] + counts['updated']:
+                    self.skill_indexer()
+                self.logger.info(f"Stored page {page}: {counts['inserted']} new, {counts['updated']} updated, "
+                                 f"{counts['unchanged']} unchanged")
+            else:
+                self.logger.info(f"Failed to store page {page} ({len(processed_jobs)} jobs)")
 
             page += 1
             time.sleep(1)  # Respect API rate limits
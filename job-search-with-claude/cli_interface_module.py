@@ -3,12 +3,14 @@ import logging
 import yaml
 from pathlib import Path
 import re
+from connection_pool import close_pools
 from data_management_module import DataManager
 from api_integration_module import APIIntegration
 from ai_job_matching_module import AIJobMatcher
 from rich.console import Console
 from rich.table import Table
 from rich.syntax import Syntax
+from rich.text import Text
 
 console = Console()
 
@@ -35,6 +37,19 @@ def save_config(config, config_path=CONFIG_PATH):
 
 CONFIG = load_config()
 
+def create_matcher(**kwargs):
+    matching = CONFIG.get('matching', {})
+    return AIJobMatcher(
+        CONFIG['database']['name'],
+        nlp_batch_size=matching.get('nlp_batch_size', 256),
+        nlp_processes=matching.get('nlp_processes', 1),
+        embedder=matching.get('embedder'),
+        embedding_model=matching.get('embedding_model', 'all-MiniLM-L6-v2'),
+        tfidf_features=matching.get('tfidf_features', 512),
+        rerank_factor=matching.get('rerank_factor', 4),
+        **kwargs
+    )
+
 def validate_email(ctx, param, value):
     if not re.match(r"[^@]+@[^@]+\.[^@]+", value):
         raise click.BadParameter('Invalid email address')
@@ -47,7 +62,10 @@ def validate_user_id(ctx, param, value):
 
 @click.group()
 @click.option('--debug/--no-debug', default=False, help="Enable debug logging")
-def cli(debug):
+@click.pass_context
+def cli(ctx, debug):
+    # Every command's DataManager, AIJobMatcher and APIIntegration share one connection pool.
+    ctx.call_on_close(close_pools)
     log_level = logging.DEBUG if debug else logging.INFO
     try:
         logging.basicConfig(level=log_level, 
@@ -108,10 +126,14 @@ def view_profile(user_id):
 def fetch_jobs(what, where, days, max_jobs):
     """Fetch jobs from the API and store them in the database."""
     try:
+        dm = DataManager(CONFIG['database']['name'])
+        matcher = create_matcher(data_manager=dm)
         api = APIIntegration(
             CONFIG['api']['adzuna']['app_id'],
             CONFIG['api']['adzuna']['api_key'],
-            CONFIG['database']['name']
+            CONFIG['database']['name'],
+            data_manager=dm,
+            skill_indexer=matcher.index_jobs
         )
         stored_jobs = api.fetch_and_store_jobs(what, where, days_old=days, max_jobs=max_jobs)
         console.print(f"[green]Stored {stored_jobs} jobs.[/green]")
@@ -123,11 +145,13 @@ def fetch_jobs(what, where, days, max_jobs):
 @cli.command()
 @click.option('--user-id', type=int, prompt='Your user ID', help='Your user ID', callback=validate_user_id)
 @click.option('--top-n', default=CONFIG['user']['default_top_matches'], type=int, help='Number of top matches to display')
-def match_jobs(user_id, top_n):
+@click.option('--mode', type=click.Choice(['skills', 'semantic']), default='skills',
+              help='Rank by skill overlap, or by embedding similarity (needs matching.embedder)')
+def match_jobs(user_id, top_n, mode):
     """Find top job matches for a user."""
     try:
-        matcher = AIJobMatcher(CONFIG['database']['name'])
-        top_jobs = matcher.rank_jobs_for_user(user_id, top_n)
+        matcher = create_matcher()
+        top_jobs = matcher.rank_jobs_for_user(user_id, top_n, mode)
         
         if top_jobs:
             table = Table(title=f"Top {top_n} Job Matches")
@@ -150,11 +174,12 @@ def match_jobs(user_id, top_n):
 @cli.command()
 @click.option('--user-id', type=int, prompt='Your user ID', help='Your user ID', callback=validate_user_id)
 @click.option('--top-n', default=CONFIG['user']['default_skill_recommendations'], type=int, help='Number of skills to recommend')
-def recommend_skills(user_id, top_n):
+@click.option('--days', type=int, help='Only count jobs posted in the last N days')
+def recommend_skills(user_id, top_n, days):
     """Get skill recommendations for a user."""
     try:
-        matcher = AIJobMatcher(CONFIG['database']['name'])
-        recommended_skills = matcher.get_skill_recommendations(user_id, top_n)
+        matcher = create_matcher()
+        recommended_skills = matcher.get_skill_recommendations(user_id, top_n, days)
         
         if recommended_skills:
             console.print("[green]Recommended skills to learn:[/green]")
@@ -167,22 +192,65 @@ def recommend_skills(user_id, top_n):
     finally:
         matcher.close()
 
+HIGHLIGHT_MARKERS = ('\x02', '\x03')
+
+def highlighted(snippet):
+    # Matches arrive wrapped in control characters rather than markup, so job text cannot inject styles.
+    text = Text()
+    for i, part in enumerate(re.split('[\x02\x03]', snippet or '')):
+        text.append(part, style="bold yellow" if i % 2 else None)
+    return text
+
+@cli.command()
+@click.option('--processes', type=int, help='Parser processes (default: matching.nlp_processes)')
+def index_skills(processes):
+    """Extract and store skills for every job not yet indexed."""
+    try:
+        matcher = create_matcher()
+        if processes:
+            matcher.nlp_processes = processes
+        indexed = matcher.index_job_skills()
+        console.print(f"[green]Indexed skills for {indexed} jobs.[/green]")
+    except Exception as e:
+        console.print(f"[red]An error occurred while indexing skills: {str(e)}[/red]")
+    finally:
+        matcher.close()
+
 @cli.command()
-@click.option('--keyword', prompt='Search keyword', help='Keyword to search for in job titles or descriptions')
-def search_jobs(keyword):
+@click.option('--refit', is_flag=True, help='Refit the TF-IDF model and re-embed every job')
+def index_vectors(refit):
+    """Embed every job not yet in the job vector index."""
+    try:
+        matcher = create_matcher()
+        if matcher.embedder is None:
+            console.print("[yellow]No embedder configured. Set matching.embedder to tfidf or sentence-transformers.[/yellow]")
+            return
+        embedded = matcher.index_job_vectors(refit=refit)
+        console.print(f"[green]Embedded {embedded} jobs.[/green]")
+    except Exception as e:
+        console.print(f"[red]An error occurred while embedding jobs: {str(e)}[/red]")
+    finally:
+        matcher.close()
+
+@cli.command()
+@click.option('--keyword', prompt='Search keyword',
+              help='Keywords to search for; supports "quoted phrases" and prefix* terms')
+@click.option('--limit', default=50, type=int, help='Maximum number of results')
+def search_jobs(keyword, limit):
     """Search for jobs in the database."""
     try:
         dm = DataManager(CONFIG['database']['name'])
-        jobs = dm.search_jobs(keyword)
+        jobs = dm.search_jobs(keyword, limit, HIGHLIGHT_MARKERS)
         
         if jobs:
             table = Table(title=f"Job Search Results for '{keyword}'")
             table.add_column("Title", style="cyan")
             table.add_column("Company", style="magenta")
             table.add_column("Location", style="green")
+            table.add_column("Match")
             
             for job in jobs:
-                table.add_row(job['title'], job['company'], job['location'])
+                table.add_row(job['title'], job['company'], job['location'], highlighted(job.get('snippet')))
             
             console.print(table)
         else:
@@ -256,6 +324,14 @@ def reset():
             'default_top_matches': 10,
             'default_skill_recommendations': 5
         },
+        'matching': {
+            'nlp_batch_size': 256,
+            'nlp_processes': 1,
+            'embedder': 'tfidf',
+            'embedding_model': 'all-MiniLM-L6-v2',
+            'tfidf_features': 512,
+            'rerank_factor': 4
+        },
         'logging': {
             'level': 'INFO',
             'file': 'job_search.log'
@@ -0,0 +1,104 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',          # readers and the writer no longer block each other
+    'synchronous': 'NORMAL',        # with WAL, only checkpoints fsync; commits stay durable against app crashes
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,       # negative means KiB, i.e. 64 MiB of page cache per connection
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,           # ms to wait on a competing writer instead of failing at once
+}
+
+
+class ConnectionPool:
+    def __init__(self, db_name: str, size: int = 4, pragmas: Optional[Dict[str, Any]] = None,
+                 cached_statements: int = 256):
+        self.db_name = db_name
+        # Each ':memory:' connection would be a separate database.
+        self.size = 1 if db_name == ':memory:' else size
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        # sqlite3 keeps this many prepared statements per connection; pooled connections
+        # live for the whole process, so repeated queries skip re-preparing.
+        self.cached_statements = cached_statements
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, cached_statements=self.cached_statements)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Check out a connection for one transaction: committed on success, rolled back on error.
+
+        Nested use on the same thread joins the outer transaction instead of taking
+        a second connection.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name: str, **kwargs) -> ConnectionPool:
+    """The process-wide pool for `db_name`, created on first use."""
+    key = db_name if db_name == ':memory:' else os.path.abspath(db_name)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_name, **kwargs)
+        return _pools[key]
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -1,15 +1,241 @@
+import re
 import sqlite3
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 import logging
 
+from connection_pool import get_pool
+
+JOB_COLUMNS = ('job_id', 'title', 'company', 'location', 'description', 'salary', 'url', 'date_posted')
+
+# Rows whose values are all unchanged are left alone, so they neither rewrite the page
+# nor count as changes.
+UPSERT_JOB = f'''
+    INSERT INTO jobs ({', '.join(JOB_COLUMNS)})
+    VALUES ({', '.join('?' * len(JOB_COLUMNS))})
+    ON CONFLICT (job_id) DO UPDATE SET
+        {', '.join(f"{column} = excluded.{column}" for column in JOB_COLUMNS[1:])}
+    WHERE {' OR '.join(f"{column} IS NOT excluded.{column}" for column in JOB_COLUMNS[1:])}
+'''
+
+# Full-text index over jobs. External content: the text lives only in `jobs`, and the
+# triggers keep the index in step with every insert, upsert, update and delete.
+JOBS_FTS_SCHEMA = (
+    '''
+    CREATE VIRTUAL TABLE jobs_fts USING fts5(
+        title, company, description,
+        content='jobs', content_rowid='rowid', prefix='2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER jobs_fts_insert AFTER INSERT ON jobs BEGIN
+        INSERT INTO jobs_fts (rowid, title, company, description)
+        VALUES (new.rowid, new.title, new.company, new.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER jobs_fts_delete AFTER DELETE ON jobs BEGIN
+        INSERT INTO jobs_fts (jobs_fts, rowid, title, company, description)
+        VALUES ('delete', old.rowid, old.title, old.company, old.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER jobs_fts_update AFTER UPDATE ON jobs BEGIN
+        INSERT INTO jobs_fts (jobs_fts, rowid, title, company, description)
+        VALUES ('delete', old.rowid, old.title, old.company, old.description);
+        INSERT INTO jobs_fts (rowid, title, company, description)
+        VALUES (new.rowid, new.title, new.company, new.description);
+    END
+    ''',
+)
+
+# Skills extracted from each job once, at ingest. job_skill_extractions records which
+# model produced them (and covers jobs with no skills); the (skill, job_id) primary key
+# doubles as the inverted index from skill to jobs. Editing a job's text drops its
+# skills so they are re-extracted. Every change bumps skill_index_version, so in-memory
+# or cached copies of the index know when to rebuild; its random database_id tells a
+# recreated database apart from the one a cached copy was built from.
+JOB_SKILLS_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS job_skill_extractions (
+        job_id TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        skill_count INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS job_skills (
+        skill TEXT NOT NULL,
+        job_id TEXT NOT NULL,
+        PRIMARY KEY (skill, job_id)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_job_skills_job_id ON job_skills (job_id)',
+    '''
+    CREATE TABLE IF NOT EXISTS skill_index_version (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL,
+        database_id INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    'INSERT OR IGNORE INTO skill_index_version (id, version) VALUES (0, 0)',
+    # BEFORE, so the skill_counts triggers can still read the job's old date_posted.
+    'DROP TRIGGER IF EXISTS job_skills_delete',
+    '''
+    CREATE TRIGGER job_skills_delete BEFORE DELETE ON jobs BEGIN
+        DELETE FROM job_skills WHERE job_id = old.job_id;
+        DELETE FROM job_skill_extractions WHERE job_id = old.job_id;
+        UPDATE skill_index_version SET version = version + 1;
+    END
+    ''',
+    'DROP TRIGGER IF EXISTS job_skills_update',
+    '''
+    CREATE TRIGGER job_skills_update BEFORE UPDATE OF title, description ON jobs
+    WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN
+        DELETE FROM job_skills WHERE job_id = old.job_id;
+        DELETE FROM job_skill_extractions WHERE job_id = old.job_id;
+        UPDATE skill_index_version SET version = version + 1;
+    END
+    ''',
+)
+
+# How many jobs list each skill, overall and per day posted (the first 10 characters of
+# date_posted), maintained by triggers on job_skills. Job inserts, updates and deletes all
+# reach it through job_skills, so skill recommendations are an indexed read rather than
+# a pass over every job.
+SKILL_COUNTS_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS skill_counts (
+        skill TEXT PRIMARY KEY,
+        job_count INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_skill_counts_job_count ON skill_counts (job_count DESC, skill)',
+    '''
+    CREATE TABLE IF NOT EXISTS skill_daily_counts (
+        day TEXT NOT NULL,
+        skill TEXT NOT NULL,
+        job_count INTEGER NOT NULL,
+        PRIMARY KEY (day, skill)
+    ) WITHOUT ROWID
+    ''',
+    'DROP TRIGGER IF EXISTS skill_counts_insert',
+    '''
+    CREATE TRIGGER skill_counts_insert AFTER INSERT ON job_skills BEGIN
+        INSERT INTO skill_counts (skill, job_count) VALUES (new.skill, 1)
+        ON CONFLICT (skill) DO UPDATE SET job_count = job_count + 1;
+        INSERT INTO skill_daily_counts (day, skill, job_count)
+        SELECT substr(date_posted, 1, 10), new.skill, 1 FROM jobs
+        WHERE job_id = new.job_id AND date_posted IS NOT NULL
+        ON CONFLICT (day, skill) DO UPDATE SET job_count = job_count + 1;
+    END
+    ''',
+    'DROP TRIGGER IF EXISTS skill_counts_delete',
+    '''
+    CREATE TRIGGER skill_counts_delete AFTER DELETE ON job_skills BEGIN
+        UPDATE skill_counts SET job_count = job_count - 1 WHERE skill = old.skill;
+        DELETE FROM skill_counts WHERE skill = old.skill AND job_count <= 0;
+        UPDATE skill_daily_counts SET job_count = job_count - 1
+        WHERE skill = old.skill AND day = (SELECT substr(date_posted, 1, 10) FROM jobs WHERE job_id = old.job_id);
+        DELETE FROM skill_daily_counts
+        WHERE skill = old.skill AND day = (SELECT substr(date_posted, 1, 10) FROM jobs WHERE job_id = old.job_id)
+          AND job_count <= 0;
+    END
+    ''',
+    # A new date_posted with unchanged text keeps the job's skills; move them to the new day.
+    'DROP TRIGGER IF EXISTS skill_counts_redate',
+    '''
+    CREATE TRIGGER skill_counts_redate AFTER UPDATE OF date_posted ON jobs
+    WHEN substr(old.date_posted, 1, 10) IS NOT substr(new.date_posted, 1, 10) BEGIN
+        UPDATE skill_daily_counts SET job_count = job_count - 1
+        WHERE day = substr(old.date_posted, 1, 10)
+          AND skill IN (SELECT skill FROM job_skills WHERE job_id = new.job_id);
+        DELETE FROM skill_daily_counts WHERE day = substr(old.date_posted, 1, 10) AND job_count <= 0;
+        INSERT INTO skill_daily_counts (day, skill, job_count)
+        SELECT substr(new.date_posted, 1, 10), skill, 1 FROM job_skills
+        WHERE job_id = new.job_id AND new.date_posted IS NOT NULL
+        ON CONFLICT (day, skill) DO UPDATE SET job_count = job_count + 1;
+    END
+    ''',
+)
+
+# Databases that already had skills indexed before skill_counts existed.
+SKILL_COUNTS_BACKFILL = (
+    'INSERT INTO skill_counts (skill, job_count) SELECT skill, COUNT(*) FROM job_skills GROUP BY skill',
+    '''
+    INSERT INTO skill_daily_counts (day, skill, job_count)
+    SELECT substr(jobs.date_posted, 1, 10) AS day, job_skills.skill, COUNT(*) FROM job_skills
+    JOIN jobs ON jobs.job_id = job_skills.job_id
+    WHERE jobs.date_posted IS NOT NULL
+    GROUP BY day, job_skills.skill
+    ''',
+)
+
+# Which jobs have a vector in the job vector index (stored under jobs.rowid), and from which
+# embedding model. Like their skills, a job's vector is dropped when it is deleted or its
+# text changes, so the next sync embeds it again.
+JOB_VECTORS_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS job_vectors (
+        job_id TEXT PRIMARY KEY,
+        model TEXT NOT NULL
+    )
+    ''',
+    'DROP TRIGGER IF EXISTS job_vectors_delete',
+    '''
+    CREATE TRIGGER job_vectors_delete AFTER DELETE ON jobs BEGIN
+        DELETE FROM job_vectors WHERE job_id = old.job_id;
+    END
+    ''',
+    'DROP TRIGGER IF EXISTS job_vectors_update',
+    '''
+    CREATE TRIGGER job_vectors_update AFTER UPDATE OF title, description ON jobs
+    WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN
+        DELETE FROM job_vectors WHERE job_id = old.job_id;
+    END
+    ''',
+)
+
+# Stored in PRAGMA user_version once the tables and triggers above are in place; bump it
+# whenever one of the schemas changes. Recreating triggers changes the schema cookie,
+# which makes every pooled connection re-prepare its cached statements, so up-to-date
+# databases skip it.
+SCHEMA_VERSION = 2
+
+FTS_TERM_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+def build_fts_query(keyword: str) -> str:
+    """Turn user input into an FTS5 query: "quoted phrases", prefix* terms, all terms required.
+
+    Every term is quoted, so FTS5 operators and punctuation in the input are matched literally.
+    """
+    terms = []
+    for phrase, word in FTS_TERM_PATTERN.findall(keyword):
+        if phrase.strip():
+            terms.append(f'"{phrase}"')
+        elif word:
+            text = word.rstrip('*').replace('"', '')
+            if text:
+                terms.append(f'"{text}"' + ('*' if word.endswith('*') else ''))
+    return ' '.join(terms)
+
+def _rows_to_dicts(cursor: sqlite3.Cursor) -> List[Dict[str, str]]:
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
 class DataManager:
     def __init__(self, db_name: str = 'job_search.db'):
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
+        # Connections come from a process-wide pool shared by every DataManager on the same database.
+        self.pool = get_pool(db_name)
         self._create_tables()
 
     def _create_tables(self):
-        self.cursor.execute('''
+        with self.pool.connection() as conn:
+            if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                self._migrate(conn)
+            self.fts_enabled = self._create_fts_index(conn)
+
+    def _migrate(self, conn: sqlite3.Connection):
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS jobs (
                 job_id TEXT PRIMARY KEY,
                 title TEXT,
@@ -22,7 +248,7 @@ class DataManager:
             )
         ''')
 
-        self.cursor.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS user_profile (
                 id INTEGER PRIMARY KEY,
                 name TEXT,
@@ -33,7 +259,7 @@ class DataManager:
             )
         ''')
 
-        self.cursor.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS job_interactions (
                 id INTEGER PRIMARY KEY,
                 job_id TEXT,
@@ -45,31 +271,76 @@ class DataManager:
             )
         ''')
 
-        self.conn.commit()
+        for statement in JOB_SKILLS_SCHEMA:
+            conn.execute(statement)
+        self._create_database_id(conn)
+
+        self._create_skill_counts(conn)
+
+        for statement in JOB_VECTORS_SCHEMA:
+            conn.execute(statement)
+
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _create_database_id(self, conn: sqlite3.Connection):
+        # Databases from before database_id existed gain the column here.
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(skill_index_version)')]
+        if 'database_id' not in columns:
+            conn.execute('ALTER TABLE skill_index_version ADD COLUMN database_id INTEGER NOT NULL DEFAULT 0')
+        conn.execute('UPDATE skill_index_version SET database_id = random() WHERE database_id = 0')
+
+    def _create_skill_counts(self, conn: sqlite3.Connection):
+        backfill = not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'skill_counts'").fetchone()
+        for statement in SKILL_COUNTS_SCHEMA:
+            conn.execute(statement)
+        if backfill:
+            for statement in SKILL_COUNTS_BACKFILL:
+                conn.execute(statement)
+
+    def _create_fts_index(self, conn: sqlite3.Connection) -> bool:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'jobs_fts'").fetchone():
+            return True
+        try:
+            for statement in JOBS_FTS_SCHEMA:
+                conn.execute(statement)
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5; search_jobs falls back to LIKE.
+            logging.warning(f"Full-text search unavailable: {e}")
+            return False
+        # Databases created before the index existed: index the jobs already stored.
+        conn.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('rebuild')")
+        return True
 
     def add_job(self, job: Dict[str, str]) -> bool:
+        return self.add_jobs([job]) is not None
+
+    def add_jobs(self, jobs: Iterable[Dict[str, str]]) -> Optional[Dict[str, int]]:
+        """Upsert jobs in one transaction and return inserted / updated / unchanged counts.
+
+        A job_id repeated within `jobs` keeps its last version.
+        """
         try:
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO jobs 
-                (job_id, title, company, location, description, salary, url, date_posted)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                job['job_id'], job['title'], job['company'], job['location'],
-                job['description'], job['salary'], job['url'], job['date_posted']
-            ))
-            self.conn.commit()
-            return True
+            rows = {job['job_id']: tuple(job[column] for column in JOB_COLUMNS) for job in jobs}
+            with self.pool.connection() as conn:
+                existing = 0
+                job_ids = list(rows)
+                for start in range(0, len(job_ids), 500):
+                    batch = job_ids[start:start + 500]
+                    existing += conn.execute(
+                        f"SELECT COUNT(*) FROM jobs WHERE job_id IN ({', '.join('?' * len(batch))})", batch
+                    ).fetchone()[0]
+                changed = conn.executemany(UPSERT_JOB, rows.values()).rowcount if rows else 0
+            inserted = len(rows) - existing
+            return {"inserted": inserted, "updated": changed - inserted, "unchanged": existing - (changed - inserted)}
         except sqlite3.Error as e:
-            logging.error(f"Error adding job: {e}")
-            return False
+            logging.error(f"Error adding jobs: {e}")
+            return None
 
     def get_job(self, job_id: str) -> Optional[Dict[str, str]]:
         try:
-            self.cursor.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,))
-            job = self.cursor.fetchone()
-            if job:
-                return dict(zip([column[0] for column in self.cursor.description], job))
-            return None
+            with self.pool.connection() as conn:
+                jobs = _rows_to_dicts(conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)))
+            return jobs[0] if jobs else None
         except sqlite3.Error as e:
             logging.error(f"Error retrieving job: {e}")
             return None
@@ -78,8 +349,8 @@ class DataManager:
         try:
             set_clause = ', '.join([f"{key} = ?" for key in updates.keys()])
             query = f"UPDATE jobs SET {set_clause} WHERE job_id = ?"
-            self.cursor.execute(query, list(updates.values()) + [job_id])
-            self.conn.commit()
+            with self.pool.connection() as conn:
+                conn.execute(query, list(updates.values()) + [job_id])
             return True
         except sqlite3.Error as e:
             logging.error(f"Error updating job: {e}")
@@ -87,32 +358,208 @@ class DataManager:
 
     def delete_job(self, job_id: str) -> bool:
         try:
-            self.cursor.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
-            self.conn.commit()
+            with self.pool.connection() as conn:
+                conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
             return True
         except sqlite3.Error as e:
             logging.error(f"Error deleting job: {e}")
             return False
 
+    def get_jobs(self, job_ids: Sequence[str]) -> Dict[str, Dict[str, str]]:
+        try:
+            jobs = {}
+            with self.pool.connection() as conn:
+                for start in range(0, len(job_ids), 500):
+                    batch = list(job_ids[start:start + 500])
+                    rows = conn.execute(
+                        f"SELECT * FROM jobs WHERE job_id IN ({', '.join('?' * len(batch))})", batch
+                    )
+                    jobs.update((job['job_id'], job) for job in _rows_to_dicts(rows))
+            return jobs
+        except sqlite3.Error as e:
+            logging.error(f"Error retrieving jobs: {e}")
+            return {}
+
+    def count_jobs(self) -> int:
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+        except sqlite3.Error as e:
+            logging.error(f"Error counting jobs: {e}")
+            return 0
+
     def get_all_jobs(self) -> List[Dict[str, str]]:
         try:
-            self.cursor.execute('SELECT * FROM jobs')
-            jobs = self.cursor.fetchall()
-            return [dict(zip([column[0] for column in self.cursor.description], job)) for job in jobs]
+            with self.pool.connection() as conn:
+                return _rows_to_dicts(conn.execute('SELECT * FROM jobs'))
         except sqlite3.Error as e:
             logging.error(f"Error retrieving all jobs: {e}")
             return []
 
+    def get_jobs_without_skills(self, model: str) -> List[Dict[str, str]]:
+        """Jobs whose skills have not been extracted yet, or were extracted by a different model."""
+        try:
+            with self.pool.connection() as conn:
+                return _rows_to_dicts(conn.execute('''
+                    SELECT jobs.* FROM jobs
+                    LEFT JOIN job_skill_extractions AS extraction ON extraction.job_id = jobs.job_id
+                    WHERE extraction.model IS NOT ?
+                ''', (model,)))
+        except sqlite3.Error as e:
+            logging.error(f"Error retrieving jobs without skills: {e}")
+            return []
+
+    def set_job_skills(self, job_skills: Dict[str, Iterable[str]], model: str) -> bool:
+        """Replace the stored skills of each job in one transaction."""
+        try:
+            skill_sets = {job_id: set(skills) for job_id, skills in job_skills.items()}
+            with self.pool.connection() as conn:
+                conn.executemany('DELETE FROM job_skills WHERE job_id = ?', ((job_id,) for job_id in skill_sets))
+                conn.executemany(
+                    'INSERT INTO job_skills (skill, job_id) VALUES (?, ?)',
+                    ((skill, job_id) for job_id, skills in skill_sets.items() for skill in skills)
+                )
+                conn.executemany(
+                    'INSERT OR REPLACE INTO job_skill_extractions (job_id, model, skill_count) VALUES (?, ?, ?)',
+                    ((job_id, model, len(skills)) for job_id, skills in skill_sets.items())
+                )
+                conn.execute('UPDATE skill_index_version SET version = version + 1')
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Error storing job skills: {e}")
+            return False
+
+    def get_job_skills(self, job_id: str) -> List[str]:
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute('SELECT skill FROM job_skills WHERE job_id = ? ORDER BY skill', (job_id,))
+                return [row[0] for row in rows]
+        except sqlite3.Error as e:
+            logging.error(f"Error retrieving job skills: {e}")
+            return []
+
+    def get_skill_index_version(self) -> Optional[Tuple[int, int]]:
+        # (database_id, version): versions restart with every new database.
+        try:
+            with self.pool.connection() as conn:
+                return tuple(conn.execute('SELECT database_id, version FROM skill_index_version').fetchone())
+        except sqlite3.Error as e:
+            logging.error(f"Error retrieving skill index version: {e}")
+            return None
+
+    def get_all_job_skills(self) -> List[Tuple[str, str]]:
+        """Every (job_id, skill) pair, plus (job_id, None) for indexed jobs without skills."""
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute('''
+                    SELECT extraction.job_id, job_skills.skill FROM job_skill_extractions AS extraction
+                    LEFT JOIN job_skills ON job_skills.job_id = extraction.job_id
+                ''').fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Error retrieving job skills: {e}")
+            return []
+
+    def get_top_skills(self, limit: int, exclude: Iterable[str] = (),
+                       since: Optional[str] = None) -> List[Tuple[str, int]]:
+        """The skills listed by the most jobs, as (skill, job count), leaving out `exclude`.
+
+        With `since` (an ISO date), only jobs posted on or after that day are counted.
+        """
+        try:
+            exclude = list(set(exclude))
+            not_in = f"AND skill NOT IN ({', '.join('?' * len(exclude))})" if exclude else ''
+            with self.pool.connection() as conn:
+                if since is None:
+                    return conn.execute(f'''
+                        SELECT skill, job_count FROM skill_counts
+                        WHERE job_count > 0 {not_in}
+                        ORDER BY job_count DESC, skill
+                        LIMIT ?
+                    ''', exclude + [limit]).fetchall()
+                return conn.execute(f'''
+                    SELECT skill, SUM(job_count) AS total FROM skill_daily_counts
+                    WHERE day >= ? {not_in}
+                    GROUP BY skill
+                    ORDER BY total DESC, skill
+                    LIMIT ?
+                ''', [since] + exclude + [limit]).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Error retrieving top skills: {e}")
+            return []
+
+    def get_jobs_without_vectors(self, model: str) -> List[Dict[str, str]]:
+        """Jobs not yet embedded with `model`, each with its `vector_id`."""
+        try:
+            with self.pool.connection() as conn:
+                return _rows_to_dicts(conn.execute('''
+                    SELECT jobs.rowid AS vector_id, jobs.* FROM jobs
+                    LEFT JOIN job_vectors ON job_vectors.job_id = jobs.job_id
+                    WHERE job_vectors.model IS NOT ?
+                ''', (model,)))
+        except sqlite3.Error as e:
+            logging.error(f"Error retrieving jobs without vectors: {e}")
+            return []
+
+    def get_embedded_jobs(self, model: str) -> Dict[int, str]:
+        """vector_id -> job_id for every job embedded with `model`."""
+        try:
+            with self.pool.connection() as conn:
+                return dict(conn.execute('''
+                    SELECT jobs.rowid, jobs.job_id FROM job_vectors
+                    JOIN jobs ON jobs.job_id = job_vectors.job_id
+                    WHERE job_vectors.model = ?
+                ''', (model,)))
+        except sqlite3.Error as e:
+            logging.error(f"Error retrieving embedded jobs: {e}")
+            return {}
+
+    def get_jobs_by_vector_id(self, vector_ids: Sequence[int], model: str) -> Dict[int, Dict[str, str]]:
+        """The jobs stored under `vector_ids`, skipping any no longer embedded with `model`."""
+        try:
+            jobs = {}
+            with self.pool.connection() as conn:
+                for start in range(0, len(vector_ids), 500):
+                    batch = list(vector_ids[start:start + 500])
+                    rows = conn.execute(f'''
+                        SELECT jobs.rowid AS vector_id, jobs.* FROM jobs
+                        JOIN job_vectors ON job_vectors.job_id = jobs.job_id
+                        WHERE job_vectors.model = ? AND jobs.rowid IN ({', '.join('?' * len(batch))})
+                    ''', [model] + batch)
+                    jobs.update((job['vector_id'], job) for job in _rows_to_dicts(rows))
+            return jobs
+        except sqlite3.Error as e:
+            logging.error(f"Error retrieving jobs by vector id: {e}")
+            return {}
+
+    def set_job_vectors(self, job_ids: Iterable[str], model: str) -> bool:
+        try:
+            with self.pool.connection() as conn:
+                conn.executemany('INSERT OR REPLACE INTO job_vectors (job_id, model) VALUES (?, ?)',
+                                 ((job_id, model) for job_id in job_ids))
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Error storing job vectors: {e}")
+            return False
+
+    def delete_job_vectors(self, job_ids: Iterable[str]) -> bool:
+        try:
+            with self.pool.connection() as conn:
+                conn.executemany('DELETE FROM job_vectors WHERE job_id = ?', ((job_id,) for job_id in job_ids))
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Error deleting job vectors: {e}")
+            return False
+
     def add_user_profile(self, profile: Dict[str, str]) -> bool:
         try:
-            self.cursor.execute('''
-                INSERT INTO user_profile (name, email, skills, experience, resume_text)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                profile['name'], profile['email'], profile['skills'],
-                profile['experience'], profile['resume_text']
-            ))
-            self.conn.commit()
+            with self.pool.connection() as conn:
+                conn.execute('''
+                    INSERT INTO user_profile (name, email, skills, experience, resume_text)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (
+                    profile['name'], profile['email'], profile['skills'],
+                    profile['experience'], profile['resume_text']
+                ))
             return True
         except sqlite3.Error as e:
             logging.error(f"Error adding user profile: {e}")
@@ -120,11 +567,9 @@ class DataManager:
 
     def get_user_profile(self, user_id: int) -> Optional[Dict[str, str]]:
         try:
-            self.cursor.execute('SELECT * FROM user_profile WHERE id = ?', (user_id,))
-            profile = self.cursor.fetchone()
-            if profile:
-                return dict(zip([column[0] for column in self.cursor.description], profile))
-            return None
+            with self.pool.connection() as conn:
+                profiles = _rows_to_dicts(conn.execute('SELECT * FROM user_profile WHERE id = ?', (user_id,)))
+            return profiles[0] if profiles else None
         except sqlite3.Error as e:
             logging.error(f"Error retrieving user profile: {e}")
             return None
@@ -133,8 +578,8 @@ class DataManager:
         try:
             set_clause = ', '.join([f"{key} = ?" for key in updates.keys()])
             query = f"UPDATE user_profile SET {set_clause} WHERE id = ?"
-            self.cursor.execute(query, list(updates.values()) + [user_id])
-            self.conn.commit()
+            with self.pool.connection() as conn:
+                conn.execute(query, list(updates.values()) + [user_id])
             return True
         except sqlite3.Error as e:
             logging.error(f"Error updating user profile: {e}")
@@ -142,14 +587,14 @@ class DataManager:
 
     def add_job_interaction(self, interaction: Dict[str, str]) -> bool:
         try:
-            self.cursor.execute('''
-                INSERT INTO job_interactions (job_id, user_id, interaction_type, interaction_date)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                interaction['job_id'], interaction['user_id'],
-                interaction['interaction_type'], interaction['interaction_date']
-            ))
-            self.conn.commit()
+            with self.pool.connection() as conn:
+                conn.execute('''
+                    INSERT INTO job_interactions (job_id, user_id, interaction_type, interaction_date)
+                    VALUES (?, ?, ?, ?)
+                ''', (
+                    interaction['job_id'], interaction['user_id'],
+                    interaction['interaction_type'], interaction['interaction_date']
+                ))
             return True
         except sqlite3.Error as e:
             logging.error(f"Error adding job interaction: {e}")
@@ -157,29 +602,58 @@ class DataManager:
 
     def get_job_interactions(self, job_id: str, user_id: int) -> List[Dict[str, str]]:
         try:
-            self.cursor.execute('''
-                SELECT * FROM job_interactions 
-                WHERE job_id = ? AND user_id = ?
-            ''', (job_id, user_id))
-            interactions = self.cursor.fetchall()
-            return [dict(zip([column[0] for column in self.cursor.description], interaction)) for interaction in interactions]
+            with self.pool.connection() as conn:
+                return _rows_to_dicts(conn.execute('''
+                    SELECT * FROM job_interactions
+                    WHERE job_id = ? AND user_id = ?
+                ''', (job_id, user_id)))
         except sqlite3.Error as e:
             logging.error(f"Error retrieving job interactions: {e}")
             return []
 
-    def search_jobs(self, keyword: str) -> List[Dict[str, str]]:
+    def search_jobs(self, keyword: str, limit: int = 50,
+                    highlight: Tuple[str, str] = ('[', ']')) -> List[Dict[str, str]]:
+        """Best matches first (BM25, title weighted over company over description).
+
+        Supports "quoted phrases" and prefix* terms. Each result also carries `rank`
+        and a `snippet` of the description with matches wrapped in `highlight`.
+        """
+        if not self.fts_enabled:
+            return self._search_jobs_like(keyword, limit)
+        fts_query = build_fts_query(keyword)
+        if not fts_query:
+            return []
+        try:
+            with self.pool.connection() as conn:
+                return _rows_to_dicts(conn.execute('''
+                    SELECT jobs.*,
+                           bm25(jobs_fts, 10.0, 5.0, 1.0) AS rank,
+                           snippet(jobs_fts, 2, ?, ?, '...', 16) AS snippet
+                    FROM jobs_fts
+                    JOIN jobs ON jobs.rowid = jobs_fts.rowid
+                    WHERE jobs_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                ''', (highlight[0], highlight[1], fts_query, limit)))
+        except sqlite3.Error as e:
+            logging.error(f"Error searching jobs: {e}")
+            return []
+
+    def _search_jobs_like(self, keyword: str, limit: int) -> List[Dict[str, str]]:
         try:
             query = '''
-                SELECT * FROM jobs 
+                SELECT * FROM jobs
                 WHERE title LIKE ? OR company LIKE ? OR description LIKE ?
+                LIMIT ?
             '''
             pattern = f"%{keyword}%"
-            self.cursor.execute(query, (pattern, pattern, pattern))
-            jobs = self.cursor.fetchall()
-            return [dict(zip([column[0] for column in self.cursor.description], job)) for job in jobs]
+            with self.pool.connection() as conn:
+                return _rows_to_dicts(conn.execute(query, (pattern, pattern, pattern, limit)))
         except sqlite3.Error as e:
             logging.error(f"Error searching jobs: {e}")
             return []
 
     def close(self):
-        self.conn.close()
+        # Connections belong to the shared pool and stay open for other users of this
+        # database; connection_pool.close_pools() closes them at shutdown.
+        pass
@@ -0,0 +1,143 @@
+import logging
+import os
+import pickle
+import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+
+class SentenceTransformerEmbedder:
+    """Dense embeddings from a local sentence-transformers model, loaded on first use."""
+
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', batch_size: int = 64):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+
+    def _load(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def model(self) -> str:
+        return f"sentence-transformers:{self.model_name}"
+
+    @property
+    def dimension(self) -> int:
+        return self._load().get_sentence_embedding_dimension()
+
+    def needs_fit(self, corpus_size: int) -> bool:
+        return False
+
+    def fit(self, texts: Iterable[str]):
+        pass
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return self._load().encode(list(texts), batch_size=self.batch_size, normalize_embeddings=True,
+                                   convert_to_numpy=True).astype(np.float32)
+
+
+class TfidfEmbedder:
+    """TF-IDF vectors (L2-normalised) over the `max_features` most frequent terms of the job corpus.
+
+    The fitted vectorizer is pickled to `path`. It is refitted once the corpus has doubled
+    since the last fit, so a vocabulary learnt from the first page of results does not stick.
+    """
+
+    def __init__(self, path: Optional[str], max_features: int = 512):
+        self.path = path
+        self.max_features = max_features
+        self._vectorizer = None
+        self._fitted_at = None
+        self._fitted_on = 0
+        if path:
+            try:
+                with open(path, 'rb') as model_file:
+                    self._fitted_at, self._fitted_on, self._vectorizer = pickle.load(model_file)
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError) as e:
+                if not isinstance(e, FileNotFoundError):
+                    logging.warning(f"Ignoring unreadable TF-IDF model {path}: {e}")
+
+    @property
+    def model(self) -> str:
+        # A refit changes the feature space, so every stored vector is tied to one fit.
+        return f"tfidf:{self.max_features}:{self._fitted_at}"
+
+    @property
+    def dimension(self) -> int:
+        return len(self._vectorizer.vocabulary_)
+
+    def needs_fit(self, corpus_size: int) -> bool:
+        return self._vectorizer is None or corpus_size >= 2 * self._fitted_on
+
+    def fit(self, texts: Iterable[str]):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        texts = list(texts)
+        self._vectorizer = TfidfVectorizer(max_features=self.max_features, stop_words='english',
+                                           sublinear_tf=True, dtype=np.float32).fit(texts)
+        self._fitted_at, self._fitted_on = time.time_ns(), len(texts)
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as model_file:
+                pickle.dump((self._fitted_at, self._fitted_on, self._vectorizer), model_file)
+            os.replace(tmp_path, self.path)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return self._vectorizer.transform(texts).toarray()
+
+
+def create_embedder(kind: Optional[str], model_name: str = 'all-MiniLM-L6-v2', tfidf_features: int = 512,
+                    tfidf_path: Optional[str] = None):
+    """The embedder configured by `kind` ('tfidf' or 'sentence-transformers'), or None to disable."""
+    if kind in (None, 'none'):
+        return None
+    if kind == 'tfidf':
+        return TfidfEmbedder(tfidf_path, tfidf_features)
+    if kind == 'sentence-transformers':
+        return SentenceTransformerEmbedder(model_name)
+    raise ValueError(f"Unknown embedder: {kind}")
+
+
+class JobVectorIndex:
+    """Normalised job embeddings in a flat inner-product (cosine) FAISS index, keyed by the job's rowid."""
+
+    def __init__(self, path: Optional[str], dimension: int):
+        self.path = path
+        index = None
+        if path and os.path.exists(path):
+            try:
+                index = faiss.read_index(path)
+            except RuntimeError as e:
+                logging.warning(f"Ignoring unreadable job vector index {path}: {e}")
+            if index is not None and index.d != dimension:
+                index = None
+        self.index = index or faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+
+    def ids(self) -> np.ndarray:
+        return faiss.vector_to_array(self.index.id_map)
+
+    def remove(self, ids: Sequence[int]):
+        if len(ids):
+            self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray):
+        # Replaces any vector already stored under the same id.
+        self.remove(ids)
+        self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if k <= 0 or self.index.ntotal == 0:
+            return []
+        scores, ids = self.index.search(np.asarray(vector, dtype=np.float32).reshape(1, -1), k)
+        return [(int(i), float(score)) for i, score in zip(ids[0], scores[0]) if i != -1]
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,74 @@
+import logging
+import os
+import pickle
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse
+
+
+class SkillMatrix:
+    """Binary job x skill matrix (CSR) for scoring every job against a skill set at once."""
+
+    def __init__(self, job_ids: List[str], vocabulary: Dict[str, int], matrix: scipy.sparse.csr_matrix):
+        self.job_ids = job_ids
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+        self.job_skill_counts = np.asarray(matrix.sum(axis=1), dtype=np.float32).ravel()
+
+    @classmethod
+    def from_job_skills(cls, job_skills: Iterable[Tuple[str, Optional[str]]]) -> 'SkillMatrix':
+        # (job_id, skill) pairs; a None skill registers a job that has no skills.
+        rows: Dict[str, int] = {}
+        vocabulary: Dict[str, int] = {}
+        row_indices, col_indices = [], []
+        for job_id, skill in job_skills:
+            row = rows.setdefault(job_id, len(rows))
+            if skill is not None:
+                row_indices.append(row)
+                col_indices.append(vocabulary.setdefault(skill, len(vocabulary)))
+        matrix = scipy.sparse.csr_matrix(
+            (np.ones(len(row_indices), dtype=np.float32), (row_indices, col_indices)),
+            shape=(len(rows), len(vocabulary))
+        )
+        # A repeated pair would otherwise sum to 2.
+        matrix.data[:] = 1.0
+        return cls(list(rows), vocabulary, matrix)
+
+    def jaccard(self, skills: Iterable[str]) -> np.ndarray:
+        """Jaccard similarity between `skills` and every job, via one sparse mat-vec."""
+        skills = set(skills)
+        query = np.zeros(len(self.vocabulary), dtype=np.float32)
+        query[[self.vocabulary[skill] for skill in skills if skill in self.vocabulary]] = 1.0
+        overlap = self.matrix @ query
+        union = self.job_skill_counts + len(skills) - overlap
+        return np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+
+    def top_n(self, skills: Iterable[str], n: int) -> List[Tuple[str, float]]:
+        """The `n` best-scoring jobs with a non-zero score, best first."""
+        scores = self.jaccard(skills)
+        n = min(n, len(scores))
+        if n <= 0:
+            return []
+        # argpartition finds the top n in linear time; only those n get sorted.
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.job_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self, path: str, version: Tuple[int, int]):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as matrix_file:
+            pickle.dump((version, self), matrix_file)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str, version: Tuple[int, int]) -> Optional['SkillMatrix']:
+        # None when missing, unreadable or built from an older skill index or another database.
+        try:
+            with open(path, 'rb') as matrix_file:
+                saved_version, matrix = pickle.load(matrix_file)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.warning(f"Ignoring unreadable skill matrix {path}: {e}")
+            return None
+        return matrix if saved_version == version else None